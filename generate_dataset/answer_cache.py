@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import time
+import graph_algo
+
+# Bump a task's version whenever its oracle's answers change; entries written
+# under an older version are ignored and removed by invalidate().
+ORACLE_VERSIONS = {
+    'cycle': 1,
+    'connectivity': 1,
+    'bipartite': 1,
+    'topology': 1,
+    'shortest': 1,
+    'triangle': 1,
+    'flow': 1,
+    'hamilton': 1,
+    'substructure': 1,
+}
+
+
+def undirected_canonical(edges):
+    return sorted({(min(u, v), max(u, v)) for u, v in ((edge[0], edge[1]) for edge in edges)})
+
+
+def directed_canonical(edges):
+    return sorted({(edge[0], edge[1]) for edge in edges})
+
+
+def weighted_canonical(edges, directed):
+    # duplicate edges keep the last weight, exactly as the oracles do
+    last = {}
+    for u, v, w in edges:
+        last[(u, v) if directed else (min(u, v), max(u, v))] = w
+    return sorted((u, v, w) for (u, v), w in last.items())
+
+
+def canonical_form(task_name, query):
+    # Everything the task's answer depends on, in a form where equivalent
+    # graphs compare equal. Topology keeps the raw edge order because the
+    # printed order follows it.
+    if task_name == 'cycle':
+        return [undirected_canonical(graph_algo.extract_edges_a(query))]
+    if task_name == 'connectivity':
+        return [undirected_canonical(graph_algo.extract_edges_a(query)), graph_algo.extract_nodes(query)]
+    if task_name == 'bipartite':
+        return [undirected_canonical(graph_algo.extract_edges_b(query))]
+    if task_name == 'topology':
+        return [graph_algo.extract_edges_b(query)]
+    if task_name == 'shortest':
+        return [weighted_canonical(graph_algo.extract_edges_c(query), False), graph_algo.extract_nodes(query)]
+    if task_name == 'triangle':
+        weights = dict((node, weight) for node, weight in graph_algo.extract_node_weights(query))
+        return [undirected_canonical(graph_algo.extract_edges_a(query)), sorted(weights.items())]
+    if task_name == 'flow':
+        return [weighted_canonical(graph_algo.extract_edges_d(query), True), graph_algo.extract_nodes(query)]
+    if task_name == 'hamilton':
+        return [undirected_canonical(graph_algo.extract_edges_a(query)), graph_algo.extract_node_num(query)]
+    if task_name == 'substructure':
+        edges1, edges2 = graph_algo.extract_edges_subgraph(query)
+        return [directed_canonical(edges1), directed_canonical(edges2)]
+    raise ValueError(f"Unknown task: {task_name}")
+
+
+def cache_key(task_name, query):
+    payload = json.dumps([task_name, canonical_form(task_name, query)], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, path="oracle-cache.sqlite", max_entries=2_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, task TEXT NOT NULL, version INTEGER NOT NULL, "
+            "answer TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self.conn.commit()
+
+    def get(self, task_name, query):
+        key = cache_key(task_name, query)
+        row = self.conn.execute(
+            "SELECT answer FROM answers WHERE key = ? AND version = ?",
+            (key, ORACLE_VERSIONS[task_name]),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched[key] = time.time()
+        return row[0]
+
+    def put(self, task_name, query, answer):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO answers (key, task, version, answer, last_used) VALUES (?, ?, ?, ?, ?)",
+            (cache_key(task_name, query), task_name, ORACLE_VERSIONS[task_name], answer, time.time()),
+        )
+
+    def commit(self):
+        # hits only bump their recency here, in one batch, then the least
+        # recently used entries beyond max_entries are evicted
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE answers SET last_used = ? WHERE key = ?",
+                [(stamp, key) for key, stamp in self._touched.items()],
+            )
+            self._touched = {}
+        count = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM answers WHERE key IN "
+                "(SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.conn.commit()
+
+    def invalidate(self, task_name=None):
+        if task_name is None:
+            for name, version in ORACLE_VERSIONS.items():
+                self.conn.execute("DELETE FROM answers WHERE task = ? AND version != ?", (name, version))
+        else:
+            self.conn.execute("DELETE FROM answers WHERE task = ?", (task_name,))
+        self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,47 @@
+import numpy as np
+import graph_csr
+
+
+class AnswerTables:
+    # Per-graph lookup tables for pair questions: a dense component id per
+    # node and, for weighted graphs, the all-pairs shortest distance matrix.
+    # Both are built once, so any number of pair questions on the same graph
+    # are answered by indexing.
+    def __init__(self, g, components=None):
+        self.g = g
+        if components is None:
+            components = graph_csr.connected_components(g)[0]
+        self.components = np.array(components, dtype=np.int64)
+        self._distances = None
+
+    @property
+    def distances(self):
+        if self._distances is None:
+            self._distances = floyd_warshall(self.g)
+        return self._distances
+
+    def connected(self, node1, node2):
+        index = self.g.index
+        if node1 not in index or node2 not in index:
+            return False
+        return self.components[index[node1]] == self.components[index[node2]]
+
+    def shortest_distance(self, node1, node2):
+        index = self.g.index
+        if node1 not in index or node2 not in index:
+            return None
+        distance = self.distances[index[node1], index[node2]]
+        if np.isinf(distance):
+            return None
+        return int(distance)
+
+
+def floyd_warshall(g):
+    n = g.num_nodes
+    dist = np.full((n, n), np.inf)
+    src = np.repeat(np.arange(n), np.diff(g.offsets))
+    dist[src, g.targets] = g.weights
+    np.fill_diagonal(dist, 0)
+    for k in range(n):
+        np.minimum(dist, dist[:, k, None] + dist[None, k, :], out=dist)
+    return dist
@@ -0,0 +1,271 @@
+import random
+import numpy as np
+import graph_csr
+import triangles
+
+# Graphs up to this many nodes are packed with padding to the largest of
+# their block: node v of graph g becomes g * n + v. Larger ones go through
+# the per-graph CSR code.
+BATCH_MAX_NODES = 256
+# padded cells per block (cells(n) per graph of n nodes), which bounds the
+# temporaries of one vectorized step
+MAX_CELLS = 1 << 24
+
+
+def graph_size(context):
+    # node ids run up to the stated node count or the largest label used
+    if len(context.edges) == 0:
+        return context.num_nodes
+    return max(context.num_nodes, int(context.edges[:, :2].max()) + 1)
+
+
+def blocks(sizes, cells):
+    # Indices of the graphs that fit, sorted by size and cut into blocks of
+    # at most MAX_CELLS cells (cells(n) per graph), so small graphs are not
+    # padded to large ones.
+    order = sorted((i for i, n in enumerate(sizes) if n <= BATCH_MAX_NODES), key=sizes.__getitem__)
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        while stop < len(order) and (stop - start + 1) * cells(sizes[order[stop]]) <= MAX_CELLS:
+            stop += 1
+        yield order[start:stop], max(sizes[order[stop - 1]], 1)
+        start = stop
+
+
+def pack_edges(contexts, n):
+    # The block as one disjoint union: arc endpoints in padded ids and the
+    # nodes that appear in an edge, as (graphs, n) bool.
+    counts = [len(context.edges) for context in contexts]
+    if sum(counts):
+        edges = np.concatenate([context.edges[:, :2] for context in contexts])
+    else:
+        edges = np.zeros((0, 2), dtype=np.int64)
+    offset = np.repeat(np.arange(len(contexts), dtype=np.int64) * n, counts)
+    src = edges[:, 0] + offset
+    dst = edges[:, 1] + offset
+    present = np.zeros(len(contexts) * n, dtype=bool)
+    present[src] = True
+    present[dst] = True
+    return src, dst, present.reshape(len(contexts), n)
+
+
+def components(num_nodes, src, dst):
+    # Hook-and-compress over an undirected edge list (both directions):
+    # each round hooks the tree of every edge's endpoint under the smaller
+    # label it sees, then flattens the trees, so the rounds grow with
+    # log(diameter) rather than the diameter. Every node ends up labelled
+    # with the smallest node of its component.
+    labels = np.arange(num_nodes)
+    while True:
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[src], np.minimum(labels[src], labels[dst]))
+        while True:
+            flat = hooked[hooked]
+            if np.array_equal(flat, hooked):
+                break
+            hooked = flat
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def _run(contexts, kernel, fallback, cells, extra=None):
+    # kernel(contexts, n, extra) answers one packed block; graphs too large
+    # to pack get fallback(context, extra) one at a time
+    sizes = [graph_size(context) for context in contexts]
+    results = [None] * len(contexts)
+    for i, n in enumerate(sizes):
+        if n > BATCH_MAX_NODES:
+            results[i] = fallback(contexts[i], extra[i] if extra is not None else None)
+    for block, n in blocks(sizes, cells):
+        answers = kernel(
+            [contexts[i] for i in block], n, [extra[i] for i in block] if extra is not None else None
+        )
+        for i, answer in zip(block, answers):
+            results[i] = answer
+    return results
+
+
+def _labels(contexts, n):
+    src, dst, present = pack_edges(contexts, n)
+    labels = components(len(contexts) * n, np.concatenate([src, dst]), np.concatenate([dst, src]))
+    return src, dst, present, labels.reshape(len(contexts), n)
+
+
+def _has_cycle_block(contexts, n, _):
+    # a simple undirected graph is a forest iff edges = nodes - components;
+    # a self-loop is a cycle on its own
+    src, dst, present, labels = _labels(contexts, n)
+    graph = src // n
+    loops = np.bincount(graph[src == dst], minlength=len(contexts)) > 0
+    keys = np.unique(np.minimum(src, dst) * (len(contexts) * n) + np.maximum(src, dst))
+    lo, hi = np.divmod(keys, len(contexts) * n)
+    edges = np.bincount(lo[lo != hi] // n, minlength=len(contexts))
+    roots = (present & (labels == np.arange(len(contexts) * n).reshape(len(contexts), n))).sum(axis=1)
+    return (loops | (edges > present.sum(axis=1) - roots)).tolist()
+
+
+def has_cycle(contexts):
+    return _run(
+        contexts, _has_cycle_block,
+        lambda context, _: graph_csr.has_undirected_cycle(context.undirected()),
+        cells=lambda n: 4 * n,
+    )
+
+
+def _is_bipartite_block(contexts, n, _):
+    # A graph is bipartite iff no node shares a component with its copy in
+    # the bipartite double cover (node v on side 0 or 1, edges across sides).
+    src, dst, present = pack_edges(contexts, n)
+    even, odd = 2 * src, 2 * dst + 1
+    labels = components(
+        2 * len(contexts) * n,
+        np.concatenate([even, odd, 2 * dst, 2 * src + 1]),
+        np.concatenate([odd, even, 2 * src + 1, 2 * dst]),
+    )
+    same = (labels[0::2] == labels[1::2]).reshape(len(contexts), n)
+    return (~(present & same).any(axis=1)).tolist()
+
+
+def is_bipartite(contexts):
+    return _run(
+        contexts, _is_bipartite_block,
+        lambda context, _: graph_csr.two_coloring(context.undirected()) is not None,
+        cells=lambda n: 8 * n,
+    )
+
+
+def _words(n):
+    return (n + 63) // 64
+
+
+def _highest_bit(words):
+    # index of the highest set bit of every nonzero uint64, exactly: each
+    # 32-bit half is exact in a float64, whose exponent is its bit length
+    high = words >> np.uint64(32)
+    upper = high != 0
+    half = np.where(upper, high, words & np.uint64(0xFFFFFFFF))
+    return np.frexp(half.astype(np.float64))[1] - 1 + 32 * upper
+
+
+def _triangle_block(contexts, n, _):
+    # The oriented bitsets of triangles.max_triangle_weight for the whole
+    # block at once: within each graph bit b is the node of b-th smallest
+    # weight, every edge is oriented from its lower to its higher padded id,
+    # and the heaviest third corner of an edge's triangles is the highest bit
+    # of the AND of its ends' bitsets.
+    count = len(contexts)
+    src, dst, _ = pack_edges(contexts, n)
+    weights = [np.asarray(context.node_weights, dtype=np.int64).reshape(-1, 2) for context in contexts]
+    given = np.concatenate(weights)
+    owner = np.repeat(np.arange(count, dtype=np.int64) * n, [len(w) for w in weights])
+    inside = (given[:, 0] >= 0) & (given[:, 0] < n)
+    weight = np.zeros(count * n, dtype=np.int64)
+    weight[owner[inside] + given[inside, 0]] = given[inside, 1]
+    graph = np.repeat(np.arange(count, dtype=np.int64), n)
+    order = np.lexsort((weight, graph))
+    bit_of = np.empty(count * n, dtype=np.int64)
+    bit_of[order] = np.arange(count * n) - graph[order] * n
+    weight_of_bit = weight[order].reshape(count, n)
+    best = np.full(count, np.iinfo(np.int64).min)
+    found = np.zeros(count, dtype=bool)
+
+    lo = np.minimum(src, dst)[src != dst]
+    hi = np.maximum(src, dst)[src != dst]
+    lo, hi = np.divmod(np.unique(lo * (count * n) + hi), count * n)
+    out = np.zeros((count * n, _words(n)), dtype=np.uint64)
+    bit = bit_of[hi]
+    np.bitwise_or.at(out, (lo, bit >> 6), np.left_shift(np.uint64(1), (bit & 63).astype(np.uint64)))
+    common = out[lo]
+    common &= out[hi]
+    nonzero = common != 0
+    closed = nonzero.any(axis=1)
+    if closed.any():
+        lo, hi, common, nonzero = lo[closed], hi[closed], common[closed], nonzero[closed]
+        word = nonzero.shape[1] - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+        third = word * 64 + _highest_bit(common[np.arange(len(word)), word])
+        g = lo // n
+        np.maximum.at(best, g, weight[lo] + weight[hi] + weight_of_bit[g, third])
+        found[g] = True
+
+    # a self-loop on x closes x-x-y-x with its heaviest neighbour y (x itself
+    # included), as in triangles.max_triangle_weight
+    loops = src[src == dst]
+    if len(loops):
+        heaviest = np.full(count * n, np.iinfo(np.int64).min)
+        np.maximum.at(heaviest, src, weight[dst])
+        np.maximum.at(heaviest, dst, weight[src])
+        g = loops // n
+        np.maximum.at(best, g, 2 * weight[loops] + heaviest[loops])
+        found[g] = True
+    return [int(value) if ok else None for value, ok in zip(best.tolist(), found.tolist())]
+
+
+def max_triangle_weight(contexts):
+    # triangles.max_triangle_weight of every graph (None when it has no
+    # triangle), weights from context.node_weights
+    def fallback(context, _):
+        g = context.undirected()
+        weights = dict(context.node_weights)
+        return triangles.max_triangle_weight(g, [weights[label] for label in g.labels])
+    return _run(contexts, _triangle_block, fallback, cells=lambda n: 8 * n * n * _words(n))
+
+
+def _pair_lookup(table, present, pairs_per_graph, n):
+    # table(graphs, us, vs) for every asked pair at once, False for nodes
+    # outside the graph; split back into one list per graph
+    counts = [len(pairs) for pairs in pairs_per_graph]
+    arr = np.array([pair for pairs in pairs_per_graph for pair in pairs], dtype=np.int64).reshape(-1, 2)
+    graph = np.repeat(np.arange(len(counts)), counts)
+    inside = (arr >= 0).all(axis=1) & (arr < n).all(axis=1)
+    u = np.where(inside, arr[:, 0], 0)
+    v = np.where(inside, arr[:, 1], 0)
+    answers = (inside & present[graph, u] & present[graph, v] & table(graph, u, v)).tolist()
+    bounds = np.cumsum([0] + counts).tolist()
+    return [answers[bounds[i]:bounds[i + 1]] for i in range(len(counts))]
+
+
+def _connected_block(contexts, n, pairs_per_graph):
+    _, _, present, labels = _labels(contexts, n)
+    return _pair_lookup(lambda g, u, v: labels[g, u] == labels[g, v], present, pairs_per_graph, n)
+
+
+def connected_pairs(contexts, pairs_per_graph):
+    # one list of bools per graph, as AnswerTables.connected answers them
+    def fallback(context, pairs):
+        g = context.undirected()
+        labels = context.components()[0]
+        index = g.index
+        return [u in index and v in index and labels[index[u]] == labels[index[v]] for u, v in pairs]
+    return _run(contexts, _connected_block, fallback, cells=lambda n: 4 * n, extra=pairs_per_graph)
+
+
+def test_max_triangle_weight(num_graphs=3000):
+    # against the per-graph kernel: random weighted graphs with self-loops,
+    # repeated edges in both directions, isolated nodes, weights past 2^31
+    # and a few graphs too large to pack
+    import task_registry
+    rng = random.Random(0)
+    contexts = []
+    for i in range(num_graphs):
+        num_nodes = rng.randint(1, 300 if i % 50 == 0 else 80)
+        edges = [(rng.randrange(num_nodes), rng.randrange(num_nodes)) for _ in range(rng.randint(0, 3 * num_nodes))]
+        if rng.random() < 0.5:
+            edges = [(u, v) for u, v in edges if u != v]
+        scale = 1 << 40 if rng.random() < 0.1 else 20
+        weights = [(u, rng.randint(-scale if rng.random() < 0.1 else 0, scale)) for u in range(num_nodes)]
+        contexts.append(task_registry.graph_context(num_nodes, edges, weights))
+    expected = []
+    for context in contexts:
+        g = graph_csr.build_csr(context.pairs())
+        weights = dict(context.node_weights)
+        expected.append(triangles.max_triangle_weight(g, [weights[label] for label in g.labels]))
+    answers = max_triangle_weight(contexts)
+    mismatches = sum(answer != value for answer, value in zip(answers, expected))
+    print(f"Checked {len(contexts)} triangle answers, {mismatches} mismatches")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    test_max_triangle_weight()
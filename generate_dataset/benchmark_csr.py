@@ -0,0 +1,131 @@
+import random
+import time
+import networkx as nx
+import graph_algo
+
+
+def nx_has_cycle(edges):
+    G = nx.Graph()
+    G.add_edges_from(edges)
+    try:
+        nx.find_cycle(G)
+        return "### Yes"
+    except nx.NetworkXNoCycle:
+        return "### No"
+
+
+def nx_are_nodes_connected(edges, node1, node2):
+    G = nx.Graph()
+    G.add_nodes_from({node for edge in edges for node in edge})
+    G.add_edges_from(edges)
+    if node1 not in G or node2 not in G:
+        return "### No"
+    if nx.has_path(G, node1, node2):
+        return "### Yes"
+    else:
+        return "### No"
+
+
+def nx_is_bipartite(edges):
+    G = nx.DiGraph()
+    G.add_edges_from(edges)
+    if nx.is_bipartite(G.to_undirected()):
+        return "### Yes"
+    else:
+        return "### No"
+
+
+def nx_topological_sort(edges):
+    G = nx.DiGraph()
+    G.add_edges_from(edges)
+    try:
+        return "### " + str(list(nx.topological_sort(G)))
+    except nx.NetworkXUnfeasible:
+        return "### The graph has rings and cannot be topologically sorted"
+
+
+def nx_shortest_path_weight(edges, node1, node2):
+    G = nx.Graph()
+    G.add_nodes_from({node for u, v, _ in edges for node in (u, v)})
+    for u, v, w in edges:
+        G.add_edge(u, v, weight=w)
+    if node1 not in G or node2 not in G:
+        return "### There is no path between nodes"
+    try:
+        return "### " + str(nx.dijkstra_path_length(G, node1, node2))
+    except nx.NetworkXNoPath:
+        return "### There is no path between nodes"
+
+
+def nx_max_flow(edges, source, target):
+    G = nx.DiGraph()
+    G.add_nodes_from({node for u, v, _ in edges for node in (u, v)})
+    for u, v, w in edges:
+        G.add_edge(u, v, capacity=w)
+    if source not in G or target not in G:
+        return "### 0"
+    flow_value, _ = nx.maximum_flow(G, source, target)
+    return "### " + str(flow_value)
+
+
+def random_graph(num_nodes, density, weighted=False, directed=False):
+    edges = []
+    for u in range(num_nodes):
+        for v in range(num_nodes):
+            if u == v or (not directed and v < u):
+                continue
+            if random.random() < density:
+                edges.append((u, v, random.randint(1, 10)) if weighted else (u, v))
+    return edges
+
+
+def make_cases(num_nodes, count, density):
+    cases = []
+    for _ in range(count):
+        edges = random_graph(num_nodes, density)
+        dag = [(u, v) for u, v in edges if u < v]
+        weighted = random_graph(num_nodes, density, weighted=True)
+        flow = random_graph(num_nodes, density, weighted=True, directed=True)
+        node1, node2 = random.sample(range(num_nodes), 2)
+        cases.append((edges, dag, weighted, flow, node1, node2))
+    return cases
+
+
+ORACLES = [
+    ("cycle", nx_has_cycle, graph_algo.has_cycle, lambda c: (c[0],)),
+    ("connectivity", nx_are_nodes_connected, graph_algo.are_nodes_connected, lambda c: (c[0], c[4], c[5])),
+    ("bipartite", nx_is_bipartite, graph_algo.is_bipartite, lambda c: (c[0],)),
+    ("topology", nx_topological_sort, graph_algo.topological_sort, lambda c: (c[1],)),
+    ("shortest", nx_shortest_path_weight, graph_algo.shortest_path_weight, lambda c: (c[2], c[4], c[5])),
+    ("flow", nx_max_flow, graph_algo.max_flow, lambda c: (c[3], c[4], c[5])),
+]
+
+
+def time_calls(func, args_list):
+    start = time.perf_counter()
+    results = [func(*args) for args in args_list]
+    return time.perf_counter() - start, results
+
+
+def main():
+    random.seed(0)
+    sizes = [5, 10, 20, 35, 50, 65, 80, 100]
+    count = 50
+    density = 0.1
+    print(f"{'task':<14}{'nodes':>6}{'networkx ms':>14}{'csr ms':>10}{'speedup':>9}")
+    for num_nodes in sizes:
+        cases = make_cases(num_nodes, count, density)
+        for name, nx_func, csr_func, select in ORACLES:
+            args_list = [select(case) for case in cases]
+            nx_time, nx_results = time_calls(nx_func, args_list)
+            csr_time, csr_results = time_calls(csr_func, args_list)
+            if nx_results != csr_results:
+                raise AssertionError(f"{name}: results differ for {num_nodes} nodes")
+            print(
+                f"{name:<14}{num_nodes:>6}{nx_time / count * 1000:>14.3f}"
+                f"{csr_time / count * 1000:>10.3f}{nx_time / csr_time:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import json
+import platform
+import random
+import re
+import time
+import tracemalloc
+import numpy as np
+import graph_algo
+import query_parser
+import sampling
+import synthetic
+import utils
+
+# the bins of sampling.complexity, which sample_tasks draws from
+TIERS = [("easy", 5, 35), ("middle", 36, 65), ("hard", 66, 100)]
+
+# task -> (oracle, arguments from a query), as utils.get_answer called the
+# graph_algo oracles per question before the task registry
+ORACLES = {
+    'cycle': (graph_algo.has_cycle, lambda q: (graph_algo.extract_edges_a(q),)),
+    'connectivity': (graph_algo.are_nodes_connected,
+                     lambda q: (graph_algo.extract_edges_a(q), *graph_algo.extract_nodes(q))),
+    'bipartite': (graph_algo.is_bipartite, lambda q: (graph_algo.extract_edges_b(q),)),
+    'topology': (graph_algo.topological_sort, lambda q: (graph_algo.extract_edges_b(q),)),
+    'shortest': (graph_algo.shortest_path_weight,
+                 lambda q: (graph_algo.extract_edges_c(q), *graph_algo.extract_nodes(q))),
+    'triangle': (graph_algo.max_weight_of_triangle,
+                 lambda q: (graph_algo.extract_node_weights(q), graph_algo.extract_edges_a(q))),
+    'flow': (graph_algo.max_flow, lambda q: (graph_algo.extract_edges_d(q), *graph_algo.extract_nodes(q))),
+    'hamilton': (graph_algo.has_hamiltonian_path,
+                 lambda q: (graph_algo.extract_edges_a(q), graph_algo.extract_node_num(q))),
+    'substructure': (graph_algo.is_subgraph, graph_algo.extract_edges_subgraph),
+}
+
+# what is timed per task and tier: the graph_algo extractors building the
+# oracle's arguments, query_parser.parse_query, and the oracle itself
+STAGES = ("extract", "parse_query", "oracle")
+
+# statistics compare() checks, and the smallest change of each that counts
+# as more than timer or allocator noise
+COMPARED = {"p50_ms": 0.01, "p90_ms": 0.02, "peak_kib": 16}
+
+
+def node_num(query):
+    # graph_algo.extract_node_num, which reads substructure queries ("The
+    # nodes of graph G are numbered from 0 to n") as 0; for those, G's size
+    num_nodes = graph_algo.extract_node_num(query)
+    if num_nodes == 0:
+        match = re.search(r'nodes of graph G are numbered from (\d+) to (\d+)', query)
+        if match:
+            num_nodes = int(match.group(2)) - int(match.group(1)) + 1
+    return num_nodes
+
+
+def task_queries(task_name, count, seed=0, task_dir=None):
+    # tier -> (query, answer) pairs: up to count per tier drawn from
+    # task_dir/<task>.json in one StratifiedSampler pass, as sample_bins
+    # draws node ranges, or count synthetic graphs of every tier
+    if task_dir is not None:
+        task_file = f"{task_dir}/{task_name}.json"
+        node_nums = [node_num(item["query"]) for item in utils.iter_data(task_file)]
+        sampler = sampling.StratifiedSampler(task_file, node_nums=node_nums, rng=random.Random(seed))
+    queries = {}
+    for tier, node_min, node_max in TIERS:
+        if task_dir is not None:
+            items = sampler.sample(count, node_min, node_max)
+        else:
+            items = synthetic.synthetic_items(task_name, count, node_min, node_max, seed=seed, workers=1)
+        queries[tier] = [(item["query"], item["answer"]) for item in items]
+        if any(sampling.complexity(node_num(query)) != tier for query, _ in queries[tier]):
+            raise ValueError(f"{task_name} query outside the {tier} tier")
+    return queries
+
+
+def time_calls(func, args_list, repeats):
+    # per-call seconds, the fastest of `repeats` passes, and the results of
+    # the last pass
+    best = [float("inf")] * len(args_list)
+    for _ in range(repeats):
+        results = []
+        for i, args in enumerate(args_list):
+            start = time.perf_counter()
+            results.append(func(*args))
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best, results
+
+
+def peak_memory(func, args_list):
+    # largest allocation peak of one call above what was allocated before it,
+    # in bytes, in a separate pass so tracing does not slow the timed ones
+    tracemalloc.start()
+    peak = 0
+    try:
+        for args in args_list:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def summarize(seconds, peak):
+    ms = np.array(seconds) * 1000
+    return {
+        "calls": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "per_sec": float(len(ms) / max(ms.sum() / 1000, 1e-9)),
+        "peak_kib": peak / 1024,
+    }
+
+
+def run_benchmark(tasks=None, count=50, seed=0, repeats=3, task_dir=None):
+    # {"meta": ..., "results": {task: {tier: {stage: statistics}}}}; on
+    # synthetic queries the oracle's answers are also checked against the
+    # items' and mismatches counted
+    results = {}
+    print(f"{'task':<14}{'tier':<8}{'stage':<13}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'/s':>10}{'peak KiB':>10}")
+    for task_name in tasks or ORACLES:
+        oracle, extract = ORACLES[task_name]
+        for tier, pairs in task_queries(task_name, count, seed, task_dir).items():
+            if not pairs:
+                print(f"{task_name} {tier}: no queries")
+                continue
+            queries = [(query,) for query, _ in pairs]
+            stages = {}
+            seconds, args_list = time_calls(extract, queries, repeats)
+            stages["extract"] = summarize(seconds, peak_memory(extract, queries))
+            seconds, _ = time_calls(query_parser.parse_query, queries, repeats)
+            stages["parse_query"] = summarize(seconds, peak_memory(query_parser.parse_query, queries))
+            seconds, answers = time_calls(oracle, args_list, repeats)
+            stages["oracle"] = summarize(seconds, peak_memory(oracle, args_list))
+            if task_dir is None:
+                # synthetic answers come from the task registry's oracles
+                stages["oracle"]["mismatches"] = sum(
+                    answer != expected for answer, (_, expected) in zip(answers, pairs)
+                )
+            for stage in STAGES:
+                s = stages[stage]
+                print(
+                    f"{task_name:<14}{tier:<8}{stage:<13}{s['p50_ms']:>9.3f}{s['p90_ms']:>9.3f}"
+                    f"{s['p99_ms']:>9.3f}{s['per_sec']:>10.0f}{s['peak_kib']:>10.1f}"
+                )
+            if stages["oracle"].get("mismatches"):
+                print(f"{task_name} {tier}: {stages['oracle']['mismatches']} answers differ from the items'")
+            results.setdefault(task_name, {})[tier] = stages
+    meta = {
+        "count": count,
+        "seed": seed,
+        "repeats": repeats,
+        "source": task_dir or "synthetic",
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(baseline, current, threshold=0.2):
+    # Regressions of current against baseline: a compared statistic more
+    # than `threshold` (relative) and its COMPARED minimum (absolute) above
+    # the baseline, or more oracle answers that differ from the items'.
+    regressions = []
+    for task_name, tiers in current["results"].items():
+        for tier, stages in tiers.items():
+            for stage, stats in stages.items():
+                before = baseline["results"].get(task_name, {}).get(tier, {}).get(stage)
+                if before is None:
+                    continue
+                for key, min_delta in COMPARED.items():
+                    old, new = before[key], stats[key]
+                    if new - old > max(threshold * old, min_delta):
+                        regressions.append(
+                            f"{task_name} {tier} {stage} {key}: {old:.3f} -> {new:.3f} ({new / max(old, 1e-9):.2f}x)"
+                        )
+                if stats.get("mismatches", 0) > before.get("mismatches", 0):
+                    regressions.append(
+                        f"{task_name} {tier} {stage} mismatches: {before.get('mismatches', 0)} -> {stats['mismatches']}"
+                    )
+    if baseline["meta"].get("machine") != current["meta"].get("machine"):
+        print(f"Note: baseline was taken on {baseline['meta'].get('machine')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oracle and parser latency by complexity tier")
+    parser.add_argument("--tasks", nargs="*", choices=list(ORACLES), help="default: all nine")
+    parser.add_argument("--count", type=int, default=50, help="queries per task and tier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes; each call keeps its fastest")
+    parser.add_argument("--task-dir", help="draw queries from <task-dir>/<task>.json instead of synthetic graphs")
+    parser.add_argument("--out", help="where the results are written (default oracle_baseline.json, "
+                                      "or oracle_current.json with --compare)")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+    out = args.out or ("oracle_current.json" if args.compare else "oracle_baseline.json")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        meta = baseline["meta"]
+        report = run_benchmark(args.tasks or list(baseline["results"]), meta["count"], meta["seed"], meta["repeats"],
+                               None if meta["source"] == "synthetic" else meta["source"])
+    else:
+        report = run_benchmark(args.tasks, args.count, args.seed, args.repeats, args.task_dir)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {out}")
+    if args.compare:
+        regressions = compare(baseline, report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regressions against {args.compare} (threshold {args.threshold:.0%})")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+
+BUILD_DIR = ".build"
+
+
+def file_digest(path, buffer_size=1 << 24):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_digest(objects):
+    # Source of the modules and functions a stage names; a function only
+    # covers its own body, so stages list the helpers they rely on as well.
+    h = hashlib.sha256()
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode("utf-8"))
+    return h.hexdigest()
+
+
+class Stage:
+    # One step of a build: run() reads inputs and writes outputs (file paths).
+    # Its key hashes the contents of its inputs, the source of its code and
+    # its params (seed, sizes, ...), so it is only rerun when one of them
+    # changed. adopt=True takes outputs that already exist but were never
+    # built as up to date, for hand-made artifacts such as sampled sets.
+    def __init__(self, name, run, inputs=(), outputs=(), code=(), params=None, adopt=False):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.params = params
+        self.adopt = adopt
+
+
+class Build:
+    # Runs stages in the order they were added (inputs come before the stages
+    # that read them); paths are relative to the working directory like the
+    # rest of the pipeline. Kept under build_dir:
+    #   state.json        stage -> key and output digests of its last build
+    #   digests.json      path -> (size, mtime_ns, sha256), so unchanged
+    #                     files are not hashed again
+    #   artifacts/<key>/  outputs of every stage built so far, restored
+    #                     instead of rerunning a stage when its key comes back
+    def __init__(self, build_dir=BUILD_DIR):
+        self.build_dir = build_dir
+        self.artifact_dir = os.path.join(self.build_dir, "artifacts")
+        self.stages = []
+        self.state = self._load("state.json")
+        self.digests = self._load("digests.json")
+
+    def _load(self, name):
+        path = os.path.join(self.build_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, name, data):
+        os.makedirs(self.build_dir, exist_ok=True)
+        path = os.path.join(self.build_dir, name)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+    def add(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def digest(self, path):
+        st = os.stat(path)
+        known = self.digests.get(path)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = file_digest(path)
+        self.digests[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def key(self, stage):
+        h = hashlib.sha256()
+        h.update(json.dumps([stage.name, stage.params], sort_keys=True, default=str).encode("utf-8"))
+        h.update(code_digest(stage.code).encode("utf-8"))
+        for path in stage.inputs:
+            h.update(f"{path}:{self.digest(path)}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _outputs_exist(self, stage):
+        return all(os.path.exists(path) for path in stage.outputs)
+
+    def up_to_date(self, stage, key):
+        built = self.state.get(stage.name)
+        if built is None or built["key"] != key or not self._outputs_exist(stage):
+            return False
+        return all(self.digest(path) == built["outputs"].get(path) for path in stage.outputs)
+
+    def _artifact(self, key, path):
+        return os.path.join(self.artifact_dir, key, path.replace("/", "__"))
+
+    def _restore(self, stage, key):
+        if not all(os.path.exists(self._artifact(key, path)) for path in stage.outputs):
+            return False
+        for path in stage.outputs:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            shutil.copyfile(self._artifact(key, path), f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        return True
+
+    def _store(self, stage, key):
+        os.makedirs(os.path.join(self.artifact_dir, key), exist_ok=True)
+        for path in stage.outputs:
+            shutil.copyfile(path, self._artifact(key, path))
+
+    def _record(self, stage, key):
+        self.state[stage.name] = {
+            "key": key,
+            "outputs": {path: self.digest(path) for path in stage.outputs},
+        }
+        self._save("state.json", self.state)
+        self._save("digests.json", self.digests)
+
+    def run(self, force=()):
+        # force lists stage names to rebuild whatever their key; stages
+        # downstream of them rebuild only if the new outputs differ.
+        report = {}
+        for stage in self.stages:
+            key = self.key(stage)
+            if stage.name not in force:
+                if self.up_to_date(stage, key):
+                    report[stage.name] = "fresh"
+                    continue
+                if stage.adopt and stage.name not in self.state and self._outputs_exist(stage):
+                    self._store(stage, key)
+                    self._record(stage, key)
+                    report[stage.name] = "adopted"
+                    continue
+                if self._restore(stage, key):
+                    self._record(stage, key)
+                    report[stage.name] = "restored"
+                    print(f"[build] {stage.name}: restored from {key[:12]}")
+                    continue
+            print(f"[build] {stage.name}: building")
+            stage.run()
+            self._store(stage, key)
+            self._record(stage, key)
+            report[stage.name] = "built"
+        return report
+
+    def clean(self, keep_current=True):
+        # drops stored artifacts; with keep_current the ones the recorded
+        # state points at are kept
+        keep = {built["key"] for built in self.state.values()} if keep_current else set()
+        if not os.path.exists(self.artifact_dir):
+            return 0
+        removed = 0
+        for key in os.listdir(self.artifact_dir):
+            if key not in keep:
+                shutil.rmtree(os.path.join(self.artifact_dir, key))
+                removed += 1
+        return removed
@@ -1,24 +1,42 @@
 import json
-from collections import defaultdict
 import os
+from collections import defaultdict
+import numpy as np
+from graph_algo import extract_node_num
 
-input_file = "GraphInstruct.json"
-
-task_to_data = defaultdict(list)
 
-with open(input_file, "r", encoding="utf-8") as f:
-    for line in f:
-        if line.strip():
-            item = json.loads(line.strip())
-            task = item["task"]
-            task_to_data[task].append(item)
+def split_tasks(input_file, folder_path, buffer_size=1 << 20):
+    # One pass over the input: every record is appended to its task shard as
+    # soon as it is read, and its byte offset in that shard and node count
+    # go to the index, so sampling can seek straight to qualifying records.
+    os.makedirs(folder_path, exist_ok=True)
+    writers = {}
+    offsets = defaultdict(list)
+    node_nums = defaultdict(list)
+    try:
+        with open(input_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                task = item["task"]
+                if task not in writers:
+                    writers[task] = open(f"{folder_path}/{task}.json", "wb", buffering=buffer_size)
+                writer = writers[task]
+                offsets[task].append(writer.tell())
+                node_nums[task].append(extract_node_num(item["query"]))
+                writer.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    index = {}
+    for task in writers:
+        index[f"{task}/offsets"] = np.array(offsets[task], dtype=np.int64)
+        index[f"{task}/node_num"] = np.array(node_nums[task], dtype=np.int32)
+        print(f"Saved {len(offsets[task])} items to {folder_path}/{task}.json")
+    np.savez(f"{folder_path}/index.npz", **index)
+    return index
 
-folder_path = "task-list"
-os.makedirs(folder_path, exist_ok=True)
 
-for task, items in task_to_data.items():
-    output_file = f"{folder_path}/{task}.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        for item in items:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
-    print(f"Saved {len(items)} items to {output_file}")
+if __name__ == "__main__":
+    split_tasks("GraphInstruct.json", "task-list")
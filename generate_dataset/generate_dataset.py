@@ -1,206 +1,119 @@
 import os
+import json
+import hashlib
+import multiprocessing
 import utils
 import graph_algo
 import random
-import networkx as nx
 import shutil
+from functools import partial
+import pair_sampler
+import answer_cache
+import prompts
+import graph_store
+import itertools
+import build
+import sampling
+import supervisor
+import graph_csr
+import query_parser
+import task_registry
 
 
 def generate_cycle_question(task):
-    query = task['query']
-    node_num = graph_algo.extract_node_num(query)
-    edges = task['edges']
-    node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-    edges_desc = "(" + ") (".join([f"{u}, {v}" for u, v, _ in edges]) + ")"
-    new_query = (
-        f"Determine whether or not there is a cycle in an undirected graph. "
-        f"In an undirected graph, (i,j) means that node i and node j are connected with an undirected edge. "
-        f"Given a graph, you need to output Yes or No, indicating whether there is a cycle in the graph. "
-        f"Q: {node_range_desc}, and the edges are: {edges_desc}. Is there a cycle in this graph?"
-    )
-    return new_query
+    node_num = graph_algo.extract_node_num(task['query'])
+    return prompts.cycle_query(node_num, task['edges'])
+
 
+def unit_rng(seed, *key):
+    # An independent stream per generation unit, derived from the run seed
+    # and the unit's key only, so a unit draws the same numbers whichever
+    # worker runs it and in whatever order.
+    digest = hashlib.sha256(repr((seed,) + key).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
 
-def generate_connectivity_question(task, dataset_type, used_pairs=None):
+
+def draw_question_pair(task_name, task, dataset_type, sampler=None, rng=random):
+    if sampler is None:
+        task_def = task_registry.get_task(task_name)
+        query = task['query']
+        node_num = graph_algo.extract_node_num(query)
+        edges = task['edges'] if 'edges' in task else task_def.parse(query).edges
+        sampler = task_def.sampler(edges, node_num, rng)
+    return sampler.draw(), sampler
+
+
+def generate_connectivity_question(task, dataset_type, sampler=None):
     query = task['query']
-    if used_pairs is None:
-        used_pairs = set()
     node_num = graph_algo.extract_node_num(query)
-    all_pairs = set()
-    for x in range(node_num):
-        for y in range(x + 1, node_num):
-            all_pairs.add((x, y))
-    if used_pairs.issuperset(all_pairs):
-        return None, used_pairs
-    available_pairs = all_pairs - used_pairs
-    x, y = random.choice(list(available_pairs))
-    used_pairs.add((x, y))
-    question = f"Is there a path between node {x} and node {y}?"
+    pair, sampler = draw_question_pair('connectivity', task, dataset_type, sampler)
+    if pair is None:
+        return None, sampler
+    x, y = pair
     if dataset_type == 1:
-        last_period_index = query.rfind('.')
-        if last_period_index != -1:
-            prefix = query[:last_period_index + 1]
-            new_query = f"{prefix} {question}"
-        else:
-            raise ValueError("No period found")
+        new_query = prompts.replace_question(query, prompts.connectivity_question(x, y))
     elif dataset_type == 2:
-        node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-        edges_desc = "(" + ") (".join([f"{u}, {v}" for u, v, _ in task['edges']]) + ")"
-        new_query = (
-            f"Determine whether two nodes are connected in an undirected graph. "
-            f"In an undirected graph, (i,j) means that node i and node j are connected with an undirected edge. "
-            f"Given a graph and a pair of nodes, you need to output Yes or No, indicating whether the node i and node j are connected. "
-            f"Q: {node_range_desc}, and the edges are: {edges_desc}. {question}"
-        )
-    return new_query, used_pairs
+        new_query = prompts.connectivity_query(node_num, task['edges'], x, y)
+    return new_query, sampler
 
 
 def generate_bipartite_question(task):
-    query = task['query']
-    node_num = graph_algo.extract_node_num(query)
-    edges = task['edges']
-    node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-    edges_desc = "(" + ") (".join([f"{u}->{v}" for u, v, _ in edges]) + ")"
-    new_query = (
-        f"Determine whether or not a graph is bipartite. "
-        f"In a directed graph, (i->j) means that node i and node j are connected with a directed edge from node i to node j. "
-        f"Given a graph, you need to output Yes or No, indicating whether the graph is bipartite. "
-        f"Q: {node_range_desc}, and the edges are: {edges_desc}. Is this graph bipartite?"
-    )
-    return new_query
+    node_num = graph_algo.extract_node_num(task['query'])
+    return prompts.bipartite_query(node_num, task['edges'])
 
 
 def generate_topology_sort_question(task):
-    query = task['query']
-    node_num = graph_algo.extract_node_num(query)
-    edges = task['edges']
-    node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-    edges_desc = "(" + ") (".join([f"{u}->{v}" for u, v, _ in edges]) + ")"
-    new_query = (
-        f"Find one of the topology sorting paths of the given graph. "
-        f"In a directed graph, (i->j) means that node i and node j are connected with a directed edge from node i to node j. "
-        f"Given a graph, you need to output one of the topology sorting paths of the graph. "
-        f"Q: {node_range_desc}, and the edges are: {edges_desc}. Give one topology sorting path of this graph."
-    )
-    return new_query
+    node_num = graph_algo.extract_node_num(task['query'])
+    return prompts.topology_query(node_num, task['edges'])
 
 
-def generate_shortest_path_question(task, dataset_type, used_pairs=None):
+def generate_shortest_path_question(task, dataset_type, sampler=None):
     query = task['query']
-    if used_pairs is None:
-        used_pairs = set()
     if dataset_type == 1:
         edges = graph_algo.extract_edges_c(query)
     elif dataset_type == 2:
         edges = task['edges']
     node_num = graph_algo.extract_node_num(query)
-    G = nx.Graph()
-    G.add_nodes_from(range(0, node_num))
-    G.add_weighted_edges_from(edges)
-    all_pairs = set()
-    for x in range(node_num):
-        for y in range(x + 1, node_num):
-            all_pairs.add((x, y))
-    all_connected_pairs = set()
-    for x, y in all_pairs:
-        if nx.has_path(G, x, y):
-            all_connected_pairs.add((x, y))
-    if used_pairs.issuperset(all_pairs):
-        return None, used_pairs
-    available_connected_pairs = all_connected_pairs - used_pairs
-    if available_connected_pairs:
-        x, y = random.choice(list(available_connected_pairs))
-    else:
-        available_disconnected_pairs = all_pairs - used_pairs - all_connected_pairs
-        if not available_disconnected_pairs:
-            return None, used_pairs
-        x, y = random.choice(list(available_disconnected_pairs))
-    used_pairs.add((x, y))
-    question = f"Give the weight of the shortest path from node {x} to node {y}."
+    pair, sampler = draw_question_pair('shortest', task, dataset_type, sampler)
+    if pair is None:
+        return None, sampler
+    x, y = pair
     if dataset_type == 1:
-        last_period_index = query.rfind('.')
-        if last_period_index == -1:
-            raise ValueError("No period found")
-        second_last_period_index = query.rfind('.', 0, last_period_index)
-        if second_last_period_index != -1:
-            prefix = query[:second_last_period_index + 1]
-            new_query = f"{prefix} {question}"
-        else:
-            raise ValueError("No second period found")
+        new_query = prompts.replace_question(query, prompts.shortest_question(x, y), sentences=2)
     elif dataset_type == 2:
-        node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-        edges_desc = "(" + ") (".join([f"{u},{v},{w}" for u, v, w in edges]) + ")"
-        new_query = (
-            f"Find the shortest path between two nodes in an undirected graph. "
-            f"In an undirected graph, (i,j,k) means that node i and node j are connected with an undirected edge with weight k. "
-            f"Given a graph and a pair of nodes, you need to output the weight of the shortest path between the two nodes. "
-            f"Q: {node_range_desc}, and the edges are: {edges_desc}. {question}"
-        )
-    return new_query, used_pairs
+        new_query = prompts.shortest_query(node_num, edges, x, y)
+    return new_query, sampler
 
 
-def generate_max_flow_question(query, used_pairs=None):
-    if used_pairs is None:
-        used_pairs = set()
-    node_num = graph_algo.extract_node_num(query)
-    edges = graph_algo.extract_edges_d(query)
-    G = nx.DiGraph()
-    G.add_nodes_from(range(0, node_num))
-    G.add_weighted_edges_from(edges)
-    all_pairs = set()
-    for x in range(node_num):
-        for y in range(node_num):
-            if x != y:
-                all_pairs.add((x, y))
-    all_connected_pairs = set()
-    for x, y in all_pairs:
-        if nx.has_path(G, x, y):
-            all_connected_pairs.add((x, y))
-    if used_pairs.issuperset(all_pairs):
-        return None, used_pairs
-    available_connected_pairs = all_connected_pairs - used_pairs
-    if available_connected_pairs:
-        source, target = random.choice(list(available_connected_pairs))
-    else:
-        available_disconnected_pairs = all_pairs - used_pairs - all_connected_pairs
-        if not available_disconnected_pairs:
-            return None, used_pairs
-        source, target = random.choice(list(available_disconnected_pairs))
-    used_pairs.add((source, target))
-    question = f"What is the maximum flow from node {source} to node {target}?"
-    last_period_index = query.rfind('.')
-    if last_period_index != -1:
-        prefix = query[:last_period_index + 1]
-        new_query = f"{prefix} {question}"
-    else:
-        raise ValueError("No period found")
-    return new_query, used_pairs
+def generate_max_flow_question(query, sampler=None):
+    pair, sampler = draw_question_pair('flow', {'query': query}, 1, sampler)
+    if pair is None:
+        return None, sampler
+    source, target = pair
+    return prompts.replace_question(query, prompts.flow_question(source, target)), sampler
 
 
 def generate_hamiltonian_path_question(task):
-    query = task['query']
-    node_num = graph_algo.extract_node_num(query)
-    edges = task['edges']
-    node_range_desc = f"The nodes are numbered from 0 to {node_num - 1}"
-    edges_desc = "(" + ") (".join([f"{u}, {v}" for u, v, _ in edges]) + ")"
-    new_query = (
-        f"Determine whether or not there is a Hamiltonian path in an undirected graph. "
-        f"In an undirected graph, (i,j) means that node i and node j are connected with an undirected edge. "
-        f"Given a graph, you need to output Yes or No, indicating whether there is a Hamiltonian path in the graph. "
-        f"Q: {node_range_desc}, and the edges are: {edges_desc}. Is there a Hamiltonian path in this graph?"
-    )
-    return new_query
+    node_num = graph_algo.extract_node_num(task['query'])
+    return prompts.hamilton_query(node_num, task['edges'])
+
+
+def pick_removed_edge(edges, used_pairs, rng=random):
+    available_edges = [edge for edge in edges if tuple(edge) not in used_pairs]
+    if not available_edges:
+        return None
+    removed_edge = rng.choice(available_edges)
+    used_pairs.add(tuple(removed_edge))
+    return removed_edge
 
 
 def remove_random_edge(task, used_pairs=None):
     original_edges = task['edges']
     if used_pairs is None:
         used_pairs = set()
-    available_edges = [edge for edge in original_edges if tuple(edge) not in used_pairs]
-    if not available_edges:
+    removed_edge = pick_removed_edge(original_edges, used_pairs)
+    if removed_edge is None:
         return None, used_pairs
-    removed_edge = random.choice(available_edges)
-    used_pairs.add(tuple(removed_edge))
     new_edges = [edge for edge in original_edges if edge != removed_edge]
     new_task = task.copy()
     new_task['edges'] = new_edges
@@ -208,107 +121,361 @@ def remove_random_edge(task, used_pairs=None):
     return new_task, used_pairs
 
 
-def generate_dataset1():
-    flag_sampled1 = True
-    if not flag_sampled1:
-        utils.sample_dataset1()
+def graph_questions(task_name, dataset_type, task, graph_id, generate_size, seed):
+    # All questions of one (task, graph) unit. dataset1 keeps the sampled
+    # question itself first; dataset2 asks edge-removal variants for the
+    # structural tasks and new node pairs for the others.
+    rng = unit_rng(seed, dataset_type, task_name, graph_id)
+    task_def = task_registry.get_task(task_name)
+    questions = []
+    if dataset_type == 1:
+        questions.append(graph_store.question(graph_id, task_name, 1))
+    used_pairs = set()
+    sampler = None
+    for i in range(generate_size):
+        if task_def.kind == task_registry.VARIANT:
+            removed_edge = None
+            if i > 0:
+                removed_edge = pick_removed_edge(task['edges'], used_pairs, rng)
+                if removed_edge is None:
+                    break
+            questions.append(graph_store.question(graph_id, task_name, dataset_type, removed_edge=removed_edge))
+        else:
+            pair, sampler = draw_question_pair(task_name, task, dataset_type, sampler, rng)
+            if pair is None:
+                continue
+            questions.append(graph_store.question(graph_id, task_name, dataset_type, list(pair)))
+    return questions
+
+
+def _graph_questions(unit):
+    return graph_questions(*unit)
+
+
+def generate_questions(units, workers=None):
+    # Units fan out over a pool; imap hands results back in unit order, and
+    # each unit's stream depends only on its seed, so the output is the same
+    # for any number of workers.
+    if workers is None or workers <= 1:
+        yield from map(_graph_questions, units)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(_graph_questions, units, chunksize=4)
+
+
+DATASET1_TASKS = ['connectivity', 'flow', 'shortest']
+DATASET2_TASKS = ['cycle', 'connectivity', 'bipartite', 'topology', 'shortest', 'flow', 'hamilton']
+
+# Code each build stage depends on, beyond its inputs and params (see
+# build.code_digest). Per task, the registry names its prompt templates and
+# its oracle.
+SAMPLE_CODE = [sampling, utils.sample_bins, utils.sample_dataset1, utils.sample_dataset2, unit_rng]
+GENERATE_CODE = [graph_questions, draw_question_pair, pick_removed_edge, unit_rng, pair_sampler, graph_store.question]
+STORE_CODE = [graph_store.GraphStore, graph_algo.extract_node_num, task_registry.parse_graph, query_parser]
+RENDER_CODE = [
+    graph_store.render_query, graph_store.render_item, graph_store.without_edge, prompts.replace_question,
+    prompts.node_range_desc, prompts.undirected_edges_desc, prompts.directed_edges_desc, prompts.weighted_edges_desc,
+]
+ANSWER_CODE = [graph_store.answer_graph, task_registry.GraphContext, graph_csr]
+
+
+def sample_dataset1_task(task_name, seed=0):
+    # a stale sampled set is redrawn from scratch, so it only depends on the
+    # task shard and the seed
+    sampled_file = f"sampled-dataset1/sampled_{task_name}.json"
+    if os.path.exists(sampled_file):
+        os.remove(sampled_file)
+    utils.sample_dataset1(rng=unit_rng(seed, "sample", 1, task_name), task_list=[task_name])
+
+
+def sample_dataset2_flow(seed=0):
+    sampled_file = "sampled-dataset2/sampled_flow.json"
+    if os.path.exists(sampled_file):
+        os.remove(sampled_file)
+    utils.sample_dataset2(rng=unit_rng(seed, "sample", 2, "flow"))
+
+
+def generate_dataset1_task(task_name, seed=0, workers=None):
+    # Questions on the sampled graphs of one task, and the graphs themselves
+    # as a per-task store (graph ids are "<task>/graphN").
     generate_size = 15
-    sample_path = "sampled-dataset1"
-    STR_sampled_ = "sampled_"
-    task_list = ['connectivity', 'flow', 'shortest']
-    dataset_path = 'dataset1'
-    for task_name in task_list:
-        sampled_file = f"{sample_path}/{STR_sampled_}{task_name}.json"
-        sampled_tasks = utils.load_data(sampled_file)
-        new_tasks = []
-        for task in sampled_tasks:
-            new_tasks.append(task)
-            used_pairs = None
-            for _ in range(generate_size):
-                new_task = task.copy()
-                if task_name == 'connectivity':
-                    new_question, used_pairs = generate_connectivity_question(new_task, 1, used_pairs)
-                elif task_name == 'flow':
-                    new_question, used_pairs = generate_max_flow_question(new_task['query'], used_pairs)
-                elif task_name == 'shortest':
-                    new_question, used_pairs = generate_shortest_path_question(new_task, 1, used_pairs)
-                if new_question is None:
-                    continue
-                new_task["query"] = new_question
-                new_tasks.append(new_task)
-        output_file = f"{dataset_path}/generated_{task_name}.json"
-        utils.save_data(new_tasks, output_file)
-        print(f"Generated {len(new_tasks)} new tasks, saved to {output_file}")
-
-
-def generate_dataset2():
-    flag_sampled2 = True
-    if not flag_sampled2:
-        utils.sample_dataset2()
-    sample_path = "sampled-dataset2"
-    STR_sampled_ = "sampled_"
-    task_list = ['cycle', 'connectivity', 'bipartite', 'topology', 'shortest', 'flow', 'hamilton']
-    dataset_path = 'dataset2'
-    generate_size = 9
-    for task_name in task_list:
-        sampled_file = f"{sample_path}/{STR_sampled_}flow.json"
-        sampled_tasks = utils.load_data(sampled_file)
-        new_tasks = []
-        for task in sampled_tasks:
-            used_pairs = None
-            for i in range(generate_size):
-                new_task = task.copy()
-                if task_name in ['cycle', 'bipartite', 'topology', 'hamilton']:
-                    if i == 0:
-                        new_task["removed_edge"] = None
-                    else:
-                        new_task, used_pairs = remove_random_edge(task, used_pairs)
-                        if new_task is None:
-                            break
-                if task_name == 'cycle':
-                    new_question = generate_cycle_question(new_task)
-                elif task_name == 'bipartite':
-                    new_question = generate_bipartite_question(new_task)
-                elif task_name == 'topology':
-                    new_question = generate_topology_sort_question(new_task)
-                elif task_name == 'hamilton':
-                    new_question = generate_hamiltonian_path_question(new_task)
-                elif task_name == 'shortest':
-                    new_question, used_pairs = generate_shortest_path_question(new_task, 2, used_pairs)
-                elif task_name == 'connectivity':
-                    new_question, used_pairs = generate_connectivity_question(new_task, 2, used_pairs)
-                elif task_name == 'flow':
-                    new_question, used_pairs = generate_max_flow_question(new_task['query'], used_pairs)
-                if new_question is None:
-                    continue
-                new_task["query"] = new_question
-                new_task["task"] = task_name
-                new_tasks.append(new_task)
-        output_file = f"{dataset_path}/generated_{task_name}.json"
-        utils.save_data(new_tasks, output_file)
-        print(f"Generated {len(new_tasks)} new tasks, saved to {output_file}")
-    for task_name in task_list:
-        utils.get_answer(dataset_path, task_name=task_name)
-    merge_json_files(dataset_path)
+    sampled_file = f"sampled-dataset1/sampled_{task_name}.json"
+    store_path = "dataset1/store"
+    os.makedirs(store_path, exist_ok=True)
+    task_def = task_registry.get_task(task_name)
+    store = graph_store.GraphStore()
+    units = (
+        (task_name, 1, task, f"{task_name}/{task['graph']}", generate_size, seed)
+        for task in utils.iter_data(sampled_file)
+    )
+
+    def questions():
+        for task, unit_questions in zip(utils.iter_data(sampled_file), generate_questions(units, workers)):
+            store.add(f"{task_name}/{task['graph']}", task, task_def.parse(task['query']).edges)
+            yield from unit_questions
 
+    count = utils.save_data(questions(), f"{store_path}/questions_{task_name}.json")
+    store.save(f"{store_path}/graphs_{task_name}.npz")
+    print(f"Generated {count} {task_name} questions")
 
-def merge_json_files(dataset_path, output_file="dataset2.json"):
+
+def render_dataset1_task(task_name):
+    store_path = "dataset1/store"
+    store = graph_store.GraphStore.load(f"{store_path}/graphs_{task_name}.npz")
+    output_file = f"dataset1/generated_{task_name}.json"
+    questions = utils.iter_data(f"{store_path}/questions_{task_name}.json")
+    count = utils.save_data(graph_store.render_stream(store, questions), output_file)
+    print(f"Generated {count} new tasks, saved to {output_file}")
+
+
+def build_dataset2_store():
+    os.makedirs("dataset2/store", exist_ok=True)
+    store = graph_store.GraphStore()
+    for task in utils.iter_data("sampled-dataset2/sampled_flow.json"):
+        store.add(task['graph'], task)
+    store.save("dataset2/store/graphs.npz")
+
+
+def generate_dataset2_task(task_name, seed=0, workers=None):
+    generate_size = 9
+    sampled_file = "sampled-dataset2/sampled_flow.json"
+    units = (
+        (task_name, 2, task, task['graph'], generate_size, seed)
+        for task in utils.iter_data(sampled_file)
+    )
+    questions = (q for unit_questions in generate_questions(units, workers) for q in unit_questions)
+    count = utils.save_data(questions, f"dataset2/store/questions_{task_name}.json")
+    print(f"Generated {count} {task_name} questions")
+
+
+def graph_major(store, task_list):
+    # The questions of every task, graph by graph: each task's file lists
+    # its questions in store order, so one group per file is read at a time.
+    readers = [
+        itertools.groupby(utils.iter_data(f"dataset2/store/questions_{task_name}.json"), key=lambda q: q['graph'])
+        for task_name in task_list
+    ]
+    heads = [next(reader, None) for reader in readers]
+    for graph_id in store.graph_ids:
+        for i, reader in enumerate(readers):
+            if heads[i] is not None and heads[i][0] == graph_id:
+                yield from heads[i][1]
+                heads[i] = next(reader, None)
+
+
+def answer_dataset2(task_list=DATASET2_TASKS, workers=None, budget=None, escalate=None):
+    # All tasks are answered together, graph by graph, so each graph is set
+    # up once for the seven tasks; tasks whose questions did not change are
+    # answered from the cache. Questions a budget left unanswered are listed
+    # in store/unresolved.json (see utils.get_answer).
+    if workers is None:
+        workers = os.cpu_count()
+    store = graph_store.GraphStore.load("dataset2/store/graphs.npz")
+    cache = answer_cache.AnswerCache()
+    unresolved = []
+    answered = graph_store.answer_stream(
+        store, graph_major(store, task_list), cache=cache, workers=workers, budget=budget, unresolved=unresolved
+    )
+    count = utils.save_data(answered, "dataset2/store/answers.json")
+    if unresolved and escalate:
+        items = [entry["item"] for entry in unresolved]
+        still = dict(
+            (id(q), reason) for q, reason in
+            graph_store.answer_questions(store, items, cache=cache, workers=workers, budget=supervisor.scaled(budget, escalate))
+        )
+        utils.apply_answers("dataset2/store/answers.json", {
+            entry["index"]: entry["item"]["answer"] for entry in unresolved if id(entry["item"]) not in still
+        })
+        unresolved = [dict(entry, reason=still[id(entry["item"])]) for entry in unresolved if id(entry["item"]) in still]
+    utils.save_data(unresolved, "dataset2/store/unresolved.json")
+    stats = cache.stats()
+    cache.close()
+    print(f"Answered {count} questions (answer cache: {stats['hits']} hits, {stats['misses']} misses)")
+    if unresolved:
+        print(f"Unresolved: {len(unresolved)} questions, listed in dataset2/store/unresolved.json")
+
+
+def render_dataset2(task_list=DATASET2_TASKS):
+    # one generated_<task>.json per task, merged in task order into
+    # dataset2.json with its manifest
+    store = graph_store.GraphStore.load("dataset2/store/graphs.npz")
+    for task_name in task_list:
+        output_file = f"dataset2/generated_{task_name}.json"
+        questions = (q for q in utils.iter_data("dataset2/store/answers.json") if q['task'] == task_name)
+        count = utils.save_data(graph_store.render_stream(store, questions), output_file)
+        print(f"Rendered {count} questions to {output_file}")
+    merge_json_files("dataset2", file_names=[f"generated_{task_name}.json" for task_name in task_list])
+
+
+def dataset1_build(seed=0, workers=None, resample=False):
+    # sample -> generate -> render per task. Sampled sets that are already on
+    # disk are kept (adopted) unless resample is set, as with the old
+    # flag_sampled1 switch.
+    b = build.Build()
+    for task_name in DATASET1_TASKS:
+        task_def = task_registry.get_task(task_name)
+        sampled_file = f"sampled-dataset1/sampled_{task_name}.json"
+        b.add(build.Stage(
+            f"dataset1/sample/{task_name}", partial(sample_dataset1_task, task_name, seed),
+            inputs=[f"task-list/{task_name}.json"], outputs=[sampled_file],
+            code=SAMPLE_CODE, params={"seed": seed}, adopt=not resample,
+        ))
+        questions_file = f"dataset1/store/questions_{task_name}.json"
+        graphs_file = f"dataset1/store/graphs_{task_name}.npz"
+        b.add(build.Stage(
+            f"dataset1/generate/{task_name}", partial(generate_dataset1_task, task_name, seed, workers),
+            inputs=[sampled_file], outputs=[questions_file, graphs_file],
+            code=GENERATE_CODE + STORE_CODE + task_def.sampler_code(), params={"seed": seed},
+        ))
+        b.add(build.Stage(
+            f"dataset1/render/{task_name}", partial(render_dataset1_task, task_name),
+            inputs=[questions_file, graphs_file], outputs=[f"dataset1/generated_{task_name}.json"],
+            code=RENDER_CODE + task_def.prompt_code(),
+        ))
+    return b
+
+
+def dataset2_build(seed=0, workers=None, resample=False, budget=None, escalate=None):
+    # sample -> store -> generate per task -> answer -> render. Only the
+    # tasks whose inputs, seed or generator changed are regenerated; the
+    # answer stage covers every task at once, so its per-graph setup is
+    # shared, and reads unchanged tasks' answers from the cache.
+    b = build.Build()
+    sampled_file = "sampled-dataset2/sampled_flow.json"
+    b.add(build.Stage(
+        "dataset2/sample", partial(sample_dataset2_flow, seed),
+        inputs=["task-list/flow.json"], outputs=[sampled_file],
+        code=SAMPLE_CODE, params={"seed": seed}, adopt=not resample,
+    ))
+    graphs_file = "dataset2/store/graphs.npz"
+    b.add(build.Stage(
+        "dataset2/store", build_dataset2_store,
+        inputs=[sampled_file], outputs=[graphs_file], code=STORE_CODE,
+    ))
+    questions_files = []
+    for task_name in DATASET2_TASKS:
+        task_def = task_registry.get_task(task_name)
+        questions_file = f"dataset2/store/questions_{task_name}.json"
+        questions_files.append(questions_file)
+        b.add(build.Stage(
+            f"dataset2/generate/{task_name}", partial(generate_dataset2_task, task_name, seed, workers),
+            inputs=[sampled_file], outputs=[questions_file],
+            code=GENERATE_CODE + task_def.sampler_code(), params={"seed": seed},
+        ))
+    answers_file = "dataset2/store/answers.json"
+    b.add(build.Stage(
+        "dataset2/answer", partial(answer_dataset2, DATASET2_TASKS, workers, budget, escalate),
+        inputs=[graphs_file] + questions_files, outputs=[answers_file, "dataset2/store/unresolved.json"],
+        code=ANSWER_CODE + [code for task_name in DATASET2_TASKS for code in task_registry.get_task(task_name).code],
+        params={
+            "oracle_versions": [answer_cache.ORACLE_VERSIONS[task_name] for task_name in DATASET2_TASKS],
+            "budget": budget, "escalate": escalate,
+        },
+    ))
+    b.add(build.Stage(
+        "dataset2/render", partial(render_dataset2, DATASET2_TASKS),
+        inputs=[graphs_file, answers_file],
+        outputs=[f"dataset2/generated_{task_name}.json" for task_name in DATASET2_TASKS]
+        + ["dataset2/dataset2.json", "dataset2/dataset2.json.manifest"],
+        code=RENDER_CODE + [merge_json_files]
+        + [code for task_name in DATASET2_TASKS for code in task_registry.get_task(task_name).prompt_code()],
+    ))
+    return b
+
+
+def generate_dataset1(seed=0, workers=None, resample=False, force=()):
+    return dataset1_build(seed, workers, resample).run(force)
+
+
+def generate_dataset2(seed=0, workers=None, resample=False, force=(), budget=None, escalate=None):
+    return dataset2_build(seed, workers, resample, budget, escalate).run(force)
+
+
+def merge_json_files(dataset_path, output_file="dataset2.json", interleave=False, buffer_size=1 << 24, file_names=None):
+    # The inputs are JSONL already, so they are concatenated as bytes: only
+    # the line boundaries are checked (a missing final newline is added).
+    # interleave=True takes one record from each file in turn instead. A
+    # manifest with per-file record counts (lines, in either mode) and sha256
+    # sums is written next to the output as <output_file>.manifest.
+    # file_names defaults to every .json file in dataset_path, sorted.
     output_file = os.path.join(dataset_path, output_file)
-    merged_data = []
-    for filename in os.listdir(dataset_path):
-        if filename.endswith(".json") and filename != os.path.basename(output_file):
-            file_path = os.path.join(dataset_path, filename)
-            try:
-                data = utils.load_data(file_path)
-                merged_data.extend(data)
-                print(f"Loaded file: {filename}")
-            except Exception as e:
-                print(f"Error loading file {filename}: {e}")
+    if file_names is None:
+        file_names = sorted(
+            filename for filename in os.listdir(dataset_path)
+            if filename.endswith(".json") and filename != os.path.basename(output_file)
+        )
+    tmp_file = f"{output_file}.tmp"
+    entries = []
+    output_hash = hashlib.sha256()
     try:
-        utils.save_data(merged_data, output_file)
-        print(f"Merged successfully, saved to: {output_file}")
-    except Exception as e:
-        print(f"Error saving merged file: {e}")
+        with open(tmp_file, "wb") as out:
+            if interleave:
+                readers = [open(os.path.join(dataset_path, filename), "rb", buffering=buffer_size) for filename in file_names]
+                hashes = [hashlib.sha256() for _ in file_names]
+                counts = [0] * len(file_names)
+                try:
+                    active = list(range(len(readers)))
+                    while active:
+                        still_active = []
+                        for i in active:
+                            line = readers[i].readline()
+                            if not line:
+                                continue
+                            hashes[i].update(line)
+                            if not line.endswith(b"\n"):
+                                line += b"\n"
+                            out.write(line)
+                            output_hash.update(line)
+                            counts[i] += 1
+                            still_active.append(i)
+                        active = still_active
+                finally:
+                    for reader in readers:
+                        reader.close()
+                for filename, file_hash, count in zip(file_names, hashes, counts):
+                    entries.append({"file": filename, "records": count, "sha256": file_hash.hexdigest()})
+            else:
+                buffer = bytearray(buffer_size)
+                view = memoryview(buffer)
+                for filename in file_names:
+                    file_hash = hashlib.sha256()
+                    count = 0
+                    last = b"\n"
+                    with open(os.path.join(dataset_path, filename), "rb") as f:
+                        while True:
+                            size = f.readinto(buffer)
+                            if not size:
+                                break
+                            chunk = view[:size]
+                            file_hash.update(chunk)
+                            output_hash.update(chunk)
+                            out.write(chunk)
+                            count += buffer.count(b"\n", 0, size)
+                            last = buffer[size - 1:size]
+                    if last != b"\n":
+                        out.write(b"\n")
+                        output_hash.update(b"\n")
+                        count += 1
+                    entries.append({"file": filename, "records": count, "sha256": file_hash.hexdigest()})
+                    print(f"Copied file: {filename}")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_file, output_file)
+    except OSError as e:
+        print(f"Error merging files into {output_file}: {e}")
+        return None
+    total = sum(entry["records"] for entry in entries)
+    manifest = {
+        "output": os.path.basename(output_file),
+        "records": total,
+        "sha256": output_hash.hexdigest(),
+        "interleave": interleave,
+        "files": entries,
+    }
+    with open(f"{output_file}.manifest", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Merged {total} records successfully, saved to: {output_file}")
+    return manifest
 
 
 def test_cycle():
@@ -325,11 +492,11 @@ def test_connectivity():
         "query": "Determine whether two nodes are connected in an undirected graph. In an undirected graph, (i,j) means that node i and node j are connected with an undirected edge. Given a graph and a pair of nodes, you need to output Yes or No, indicating whether the node i and node j are connected. Q: The nodes are numbered from 0 to 4, and the edges are: (0, 1) (1, 2) (2, 3) (3, 4). Is there a path between node 0 and node 4?",
         "edges": [(0, 1, 1), (1, 2, 1), (2, 3, 1), (3, 4, 1)]
     }
-    used_pairs = set()
+    sampler = None
     for _ in range(10):
-        new_query, used_pairs = generate_connectivity_question(task, 2, used_pairs)
+        new_query, sampler = generate_connectivity_question(task, 2, sampler)
         print(new_query)
-    print(f"used_pairs: {used_pairs}")
+    print(f"remaining pairs: {len(sampler)}")
 
 
 def test_bipartite():
@@ -355,9 +522,9 @@ def test_shortest_path():
         "query": "Find the shortest path from node 0 to node 4. Q: The nodes are numbered from 0 to 4, and the edges are: (0, 1, 1) (1, 2, 1) (2, 3, 1) (3, 4, 1). Give the weight of the shortest path from node 0 to node 4.",
         "edges": [(0, 1, 1), (1, 2, 1), (2, 3, 1), (3, 4, 1)]
     }
-    used_pairs = set()
+    sampler = None
     for _ in range(10):
-        new_query, used_pairs = generate_shortest_path_question(task, 2, used_pairs)
+        new_query, sampler = generate_shortest_path_question(task, 2, sampler)
         print(new_query)
 
 
@@ -1,9 +1,10 @@
-import networkx as nx
-from networkx.algorithms import isomorphism
 import re
-import itertools
-from collections import deque
-from collections import defaultdict
+import answer_tables
+import flow
+import graph_csr
+import hamilton
+import subgraph_match
+import triangles
 
 
 def extract_edges_a(input_str):
@@ -94,6 +95,13 @@ def extract_edges_subgraph(input_str):
     return g_edges, g_prime_edges
 
 
+def extract_edges_text(input_str):
+    edges_start = input_str.find("edges are:")
+    if edges_start == -1:
+        raise ValueError("'edges are:' not found")
+    return input_str[edges_start + len("edges are:"):].split(".")[0]
+
+
 def extract_nodes(input_str):
     edges_start = input_str.find("edges are:")
     if edges_start == -1:
@@ -126,146 +134,125 @@ def extract_node_num(input_str):
 
 
 def has_cycle(edges):
-    G = nx.Graph()
-    G.add_edges_from(edges)
-    try:
-        nx.find_cycle(G)
+    g = graph_csr.build_csr(edges)
+    if graph_csr.has_undirected_cycle(g):
         return "### Yes"
-    except nx.NetworkXNoCycle:
+    else:
         return "### No"
 
 
 def are_nodes_connected(edges, node1, node2):
-    G = nx.Graph()
-    all_nodes = set()
-    for u, v in edges:
-        all_nodes.add(u)
-        all_nodes.add(v)
-    G.add_nodes_from(all_nodes)
-    G.add_edges_from(edges)
-    if node1 not in G or node2 not in G:
+    g = graph_csr.build_csr(edges)
+    if node1 not in g or node2 not in g:
         return "### No"
-    if nx.has_path(G, node1, node2):
+    if graph_csr.has_path(g, g.index[node1], g.index[node2]):
         return "### Yes"
     else:
         return "### No"
 
 
+def are_nodes_connected_many(edges, pairs):
+    tables = answer_tables.AnswerTables(graph_csr.build_csr(edges))
+    return ["### Yes" if tables.connected(node1, node2) else "### No" for node1, node2 in pairs]
+
+
 def is_bipartite(edges):
-    G = nx.DiGraph()
-    G.add_edges_from(edges)
-    G_undirected = G.to_undirected()
-    if nx.is_bipartite(G_undirected):
+    g = graph_csr.build_csr(edges, directed=True)
+    if graph_csr.two_coloring(g) is not None:
         return "### Yes"
     else:
         return "### No"
 
 
 def topological_sort(edges):
-    G = nx.DiGraph()
-    G.add_edges_from(edges)
-    try:
-        sorted_nodes = list(nx.topological_sort(G))
-        return "### " + str(sorted_nodes)
-    except nx.NetworkXUnfeasible:
+    g = graph_csr.build_csr(edges, directed=True)
+    order = graph_csr.topological_order(g)
+    if order is None:
         return "### The graph has rings and cannot be topologically sorted"
+    sorted_nodes = [g.labels[i] for i in order]
+    return "### " + str(sorted_nodes)
 
 
 def shortest_path_weight(edges, node1, node2):
-    G = nx.Graph()
-    all_nodes = set()
-    for u, v, w in edges:
-        all_nodes.add(u)
-        all_nodes.add(v)
-    G.add_nodes_from(all_nodes)
-    for u, v, w in edges:
-        G.add_edge(u, v, weight=w)
-    if node1 not in G or node2 not in G:
+    g = graph_csr.build_csr(edges, weighted=True)
+    if node1 not in g or node2 not in g:
         return "### There is no path between nodes"
-    try:
-        weight = nx.dijkstra_path_length(G, node1, node2)
-        return "### " + str(weight)
-    except nx.NetworkXNoPath:
+    target = g.index[node2]
+    weight = graph_csr.dijkstra(g, g.index[node1], target)[target]
+    if weight is None:
         return "### There is no path between nodes"
+    return "### " + str(weight)
+
+
+def shortest_path_weight_many(edges, pairs):
+    tables = answer_tables.AnswerTables(graph_csr.build_csr(edges, weighted=True))
+    answers = []
+    for node1, node2 in pairs:
+        weight = tables.shortest_distance(node1, node2)
+        if weight is None:
+            answers.append("### There is no path between nodes")
+        else:
+            answers.append("### " + str(weight))
+    return answers
+
+
+def triangle_answer(max_sum):
+    return "### " + str(max_sum) if max_sum is not None else "### No triples satisfy the condition"
 
 
 def max_weight_of_triangle(node_weights, edges):
-    G = nx.Graph()
-    for u, v in edges:
-        G.add_edge(u, v)
-    weights = {node: weight for node, weight in node_weights}
-    max_sum = -float("inf")
-    for u in G.nodes:
-        for v in G.neighbors(u):
-            for w in G.neighbors(v):
-                if G.has_edge(u, w):
-                    current_sum = weights[u] + weights[v] + weights[w]
-                    if current_sum > max_sum:
-                        max_sum = current_sum
-    return "### " + str(max_sum) if max_sum != -float("inf") else "### No triples satisfy the condition"
+    # edges may also be an undirected graph_csr.CSRGraph
+    g = graph_csr.build_csr(edges)
+    weights = dict(node_weights)
+    return triangle_answer(triangles.max_triangle_weight(g, [weights[label] for label in g.labels]))
 
 
 def max_flow(edges, source, target):
-    G = nx.DiGraph()
-    all_nodes = set()
-    for u, v, w in edges:
-        all_nodes.add(u)
-        all_nodes.add(v)
-    G.add_nodes_from(all_nodes)
-    for u, v, w in edges:
-        G.add_edge(u, v, capacity=w)
-    if source not in G or target not in G:
-        return "### 0"
-    flow_value, flow_dict = nx.maximum_flow(G, source, target)
-    return "### " + str(flow_value)
+    return max_flow_many(edges, [(source, target)])[0]
 
 
-def has_hamiltonian_path(edges, num_nodes):
-    G = nx.Graph()
-    G.add_edges_from(edges)
+def max_flow_many(edges, pairs):
+    return ["### " + str(flow_value) for flow_value in flow.max_flow_many(edges, pairs)]
+
+
+def _hamiltonian_setup(edges, num_nodes):
+    g = graph_csr.build_csr(edges)
     if num_nodes == 0:
-        return "### No"
+        return "### No", None
     if num_nodes == 1:
+        return "### Yes", None
+    if g.num_nodes == 0 or graph_csr.connected_components(g)[1] != 1:
+        return "### No", None
+    if any(label < 0 or label >= num_nodes for label in g.labels):
+        raise ValueError(f"node label out of range for {num_nodes} nodes")
+    if g.num_nodes < num_nodes:
+        return "### No", None
+    adj = g.adjacency()
+    graph = {g.labels[u]: [g.labels[v] for v in adj[u]] for u in range(g.num_nodes)}
+    return None, hamilton.neighbor_masks(graph, num_nodes)
+
+
+def has_hamiltonian_path(edges, num_nodes):
+    answer, masks = _hamiltonian_setup(edges, num_nodes)
+    if answer is not None:
+        return answer
+    if hamilton.find_hamiltonian_path(masks, num_nodes) is not None:
         return "### Yes"
-    if not nx.is_connected(G):
-        return "### No"
-    graph = defaultdict(list)
-    for u, v in edges:
-        graph[u].append(v)
-        graph[v].append(u)
-    dp = [[False] * num_nodes for _ in range(1 << num_nodes)]
-    for i in range(num_nodes):
-        dp[1 << i][i] = True
-    for mask in range(1 << num_nodes):
-        for u in range(num_nodes):
-            if dp[mask][u]:
-                for v in graph[u]:
-                    if not (mask & (1 << v)):
-                        dp[mask | (1 << v)][v] = True
-    for u in range(num_nodes):
-        if dp[(1 << num_nodes) - 1][u]:
-            return "### Yes"
     return "### No"
 
 
+def hamiltonian_witness(edges, num_nodes):
+    answer, masks = _hamiltonian_setup(edges, num_nodes)
+    if answer is not None:
+        return answer, None
+    path = hamilton.find_hamiltonian_path(masks, num_nodes)
+    if path is not None:
+        return "### Yes", path
+    return "### No", None
+
+
 def is_subgraph(G_edges, G_prime_edges):
-    G = nx.DiGraph()
-    G.add_edges_from(G_edges)
-    G_prime = nx.DiGraph()
-    G_prime.add_edges_from(G_prime_edges)
-    G_nodes = list(G.nodes())
-    G_prime_nodes = list(G_prime.nodes())
-    if len(G_prime_nodes) > len(G_nodes):
-        return "### No"
-    for mapping_nodes in itertools.permutations(G_nodes, len(G_prime_nodes)):
-        mapping = {G_prime_nodes[i]: mapping_nodes[i] for i in range(len(G_prime_nodes))}
-        is_valid = True
-        for edge in G_prime_edges:
-            mapped_edge = (mapping[edge[0]], mapping[edge[1]])
-            if mapped_edge not in G_edges:
-                is_valid = False
-                break
-        if is_valid:
-            return f"### Yes"
+    if subgraph_match.is_subgraph(G_edges, G_prime_edges):
+        return "### Yes"
     return "### No"
-```
+
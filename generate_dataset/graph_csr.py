@@ -0,0 +1,438 @@
+import heapq
+import itertools
+from collections import deque
+import numpy as np
+
+
+# Edge lists up to this size skip NumPy and keep plain per-node dicts; the
+# fixed cost of the array build dominates on the smallest task graphs.
+SMALL_EDGES = 128
+
+
+class CSRGraph:
+    # Node ids are dense (0..n-1) in order of first appearance, which is the
+    # node order networkx uses, and each neighbor list keeps the order in which
+    # its edge was first inserted. Duplicate edges keep the last weight.
+    # Graphs built from small edge lists carry rows (one {target: weight} dict
+    # per node) and only pack the arrays when something asks for them.
+    def __init__(self, labels, offsets, targets, weights, directed, edge_src, edge_dst, edge_w, rows=None):
+        self.labels = labels
+        self.index = {label: i for i, label in enumerate(labels)}
+        self._offsets = offsets
+        self._targets = targets
+        self._weights = weights
+        self.directed = directed
+        self.edge_src = edge_src
+        self.edge_dst = edge_dst
+        self.edge_w = edge_w
+        self._rows = rows
+        self._adj = None
+        self._wadj = None
+        self._undirected = None
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._pack()
+        return self._offsets
+
+    @property
+    def targets(self):
+        if self._targets is None:
+            self._pack()
+        return self._targets
+
+    @property
+    def weights(self):
+        if self._offsets is None:
+            self._pack()
+        return self._weights
+
+    def _pack(self):
+        rows = self._rows
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=offsets[1:])
+        self._offsets = offsets
+        self._targets = np.array([v for row in rows for v in row], dtype=np.int64)
+        if self.edge_w is not None:
+            self._weights = np.array([w for row in rows for w in row.values()], dtype=np.int64)
+
+    @property
+    def num_nodes(self):
+        return len(self.labels)
+
+    @property
+    def num_arcs(self):
+        if self._rows is not None:
+            return sum(len(row) for row in self._rows)
+        return len(self.targets)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def adjacency(self):
+        if self._adj is None:
+            if self._rows is not None:
+                self._adj = [list(row) for row in self._rows]
+            else:
+                offsets = self.offsets.tolist()
+                targets = self.targets.tolist()
+                self._adj = [targets[offsets[i]:offsets[i + 1]] for i in range(self.num_nodes)]
+        return self._adj
+
+    def weighted_adjacency(self):
+        if self._wadj is None:
+            if self._rows is not None:
+                self._wadj = [list(row.items()) for row in self._rows]
+            else:
+                offsets = self.offsets.tolist()
+                targets = self.targets.tolist()
+                weights = self.weights.tolist()
+                self._wadj = [
+                    list(zip(targets[offsets[i]:offsets[i + 1]], weights[offsets[i]:offsets[i + 1]]))
+                    for i in range(self.num_nodes)
+                ]
+        return self._wadj
+
+    def in_degree(self):
+        if self._rows is not None:
+            degree = [0] * self.num_nodes
+            for row in self._rows:
+                for v in row:
+                    degree[v] += 1
+            return degree
+        return np.bincount(self.targets, minlength=self.num_nodes).tolist()
+
+    def undirected(self):
+        if not self.directed:
+            return self
+        if self._undirected is None:
+            build = _from_rows if self._rows is not None else _from_ids
+            self._undirected = build(self.labels, self.edge_src, self.edge_dst, self.edge_w, False)
+        return self._undirected
+
+
+def build_csr(edges, directed=False, weighted=False, nodes=None):
+    if isinstance(edges, CSRGraph):
+        return edges if edges.directed == directed else edges.undirected()
+    if not isinstance(edges, np.ndarray) and len(edges) <= SMALL_EDGES:
+        flat = [x for edge in edges for x in edge[:2]]
+        labels = list(dict.fromkeys(flat if nodes is None else list(nodes) + flat))
+        index = {label: i for i, label in enumerate(labels)}
+        ids = [index[x] for x in flat]
+        edge_w = [edge[2] for edge in edges] if weighted else None
+        return _from_rows(labels, ids[0::2], ids[1::2], edge_w, directed)
+    if isinstance(edges, np.ndarray):
+        arr = edges.astype(np.int64)
+    else:
+        width = len(edges[0]) if len(edges) else (3 if weighted else 2)
+        arr = np.fromiter(itertools.chain.from_iterable(edges), dtype=np.int64, count=width * len(edges))
+        arr = arr.reshape(len(edges), width)
+    ends = arr[:, :2].ravel()
+    flat = ends.tolist()
+    if nodes is not None:
+        flat = list(nodes) + flat
+    labels = list(dict.fromkeys(flat))
+    if labels and 0 <= min(labels) and max(labels) <= 4 * len(labels) + 1024:
+        lookup = np.empty(max(labels) + 1, dtype=np.int64)
+        lookup[labels] = np.arange(len(labels))
+        ids = lookup[ends]
+    else:
+        index = {label: i for i, label in enumerate(labels)}
+        ids = np.array([index[x] for x in ends.tolist()], dtype=np.int64)
+    edge_w = arr[:, 2].copy() if weighted else None
+    return _from_ids(labels, ids[0::2], ids[1::2], edge_w, directed)
+
+
+def _from_ids(labels, edge_src, edge_dst, edge_w, directed):
+    n = len(labels)
+    if directed:
+        src, dst, w = edge_src, edge_dst, edge_w
+    else:
+        src = np.empty(2 * len(edge_src), dtype=np.int64)
+        dst = np.empty(2 * len(edge_src), dtype=np.int64)
+        src[0::2] = edge_src
+        src[1::2] = edge_dst
+        dst[0::2] = edge_dst
+        dst[1::2] = edge_src
+        w = None if edge_w is None else np.repeat(edge_w, 2)
+    key = src * max(n, 1) + dst
+    by_key = np.argsort(key, kind="stable")
+    sorted_key = key[by_key]
+    is_first = np.ones(len(key), dtype=bool)
+    is_first[1:] = sorted_key[1:] != sorted_key[:-1]
+    first = by_key[is_first]
+    # order the surviving arcs by source, then by first insertion
+    perm = np.argsort(src[first] * len(key) + first)
+    first = first[perm]
+    targets = dst[first]
+    weights = None
+    if w is not None:
+        is_last = np.ones(len(key), dtype=bool)
+        is_last[:-1] = is_first[1:]
+        last = by_key[is_last]
+        weights = w[last[perm]]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src[first], minlength=n), out=offsets[1:])
+    return CSRGraph(labels, offsets, targets, weights, directed, edge_src, edge_dst, edge_w)
+
+
+def _from_rows(labels, edge_src, edge_dst, edge_w, directed):
+    # dicts keep first-insertion order and the last weight, like _from_ids
+    rows = [{} for _ in labels]
+    weights = edge_w if edge_w is not None else itertools.repeat(None)
+    for u, v, w in zip(edge_src, edge_dst, weights):
+        rows[u][v] = w
+        if not directed:
+            rows[v][u] = w
+    return CSRGraph(labels, None, None, None, directed, edge_src, edge_dst, edge_w, rows)
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return False
+        self.parent[rb] = ra
+        return True
+
+
+def bfs_order(g, source):
+    adj = g.adjacency()
+    seen = [False] * g.num_nodes
+    seen[source] = True
+    order = [source]
+    queue = deque(order)
+    while queue:
+        u = queue.popleft()
+        for v in adj[u]:
+            if not seen[v]:
+                seen[v] = True
+                order.append(v)
+                queue.append(v)
+    return order
+
+
+def connected_components(g):
+    adj = g.undirected().adjacency()
+    comp = [-1] * g.num_nodes
+    count = 0
+    for s in range(g.num_nodes):
+        if comp[s] != -1:
+            continue
+        comp[s] = count
+        stack = [s]
+        while stack:
+            u = stack.pop()
+            for v in adj[u]:
+                if comp[v] == -1:
+                    comp[v] = count
+                    stack.append(v)
+        count += 1
+    return comp, count
+
+
+def has_path(g, source, target):
+    if source == target:
+        return True
+    adj = g.adjacency()
+    seen = [False] * g.num_nodes
+    seen[source] = True
+    stack = [source]
+    while stack:
+        u = stack.pop()
+        for v in adj[u]:
+            if v == target:
+                return True
+            if not seen[v]:
+                seen[v] = True
+                stack.append(v)
+    return False
+
+
+def has_undirected_cycle(g):
+    g = g.undirected()
+    uf = UnionFind(g.num_nodes)
+    adj = g.adjacency()
+    for u in range(g.num_nodes):
+        for v in adj[u]:
+            if v == u:
+                return True
+            if u < v and not uf.union(u, v):
+                return True
+    return False
+
+
+def two_coloring(g):
+    adj = g.undirected().adjacency()
+    color = [-1] * g.num_nodes
+    for s in range(g.num_nodes):
+        if color[s] != -1:
+            continue
+        color[s] = 0
+        stack = [s]
+        while stack:
+            u = stack.pop()
+            c = 1 - color[u]
+            for v in adj[u]:
+                if color[v] == -1:
+                    color[v] = c
+                    stack.append(v)
+                elif color[v] != c:
+                    return None
+    return color
+
+
+def topological_order(g):
+    # Kahn's algorithm processed generation by generation, which reproduces
+    # the exact order of nx.topological_sort on a DiGraph built from the
+    # same edge list.
+    adj = g.adjacency()
+    indegree = g.in_degree()
+    generation = [v for v in range(g.num_nodes) if indegree[v] == 0]
+    order = []
+    while generation:
+        order.extend(generation)
+        next_generation = []
+        for u in generation:
+            for v in adj[u]:
+                indegree[v] -= 1
+                if indegree[v] == 0:
+                    next_generation.append(v)
+        generation = next_generation
+    if len(order) < g.num_nodes:
+        return None
+    return order
+
+
+def dijkstra(g, source, target=None):
+    wadj = g.weighted_adjacency()
+    dist = [None] * g.num_nodes
+    dist[source] = 0
+    done = [False] * g.num_nodes
+    heap = [(0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        if u == target:
+            break
+        for v, w in wadj[u]:
+            nd = d + w
+            if dist[v] is None or nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def reachability_bitsets(g):
+    # Transitive closure as one Python-int bitset per node (Warshall over
+    # rows); bit v of reach[u] is set when v can be reached from u.
+    n = g.num_nodes
+    adj = g.adjacency()
+    reach = [0] * n
+    for u in range(n):
+        for v in adj[u]:
+            reach[u] |= 1 << v
+    for k in range(n):
+        bit = 1 << k
+        row = reach[k]
+        for i in range(n):
+            if reach[i] & bit:
+                reach[i] |= row
+    return reach
+
+
+def bridges(g):
+    # Iterative Tarjan low-link over the simple undirected graph; returns the
+    # bridges as (min id, max id) pairs.
+    adj = g.undirected().adjacency()
+    n = g.num_nodes
+    disc = [-1] * n
+    low = [0] * n
+    found = set()
+    clock = 0
+    for s in range(n):
+        if disc[s] != -1:
+            continue
+        disc[s] = low[s] = clock
+        clock += 1
+        work = [(s, -1, iter(adj[s]))]
+        while work:
+            u, parent, it = work[-1]
+            for v in it:
+                if v == u:
+                    continue
+                if disc[v] == -1:
+                    disc[v] = low[v] = clock
+                    clock += 1
+                    work.append((v, u, iter(adj[v])))
+                    break
+                if v != parent and disc[v] < low[u]:
+                    low[u] = disc[v]
+            else:
+                work.pop()
+                if parent != -1:
+                    if low[u] < low[parent]:
+                        low[parent] = low[u]
+                    if low[u] > disc[parent]:
+                        found.add((min(u, parent), max(u, parent)))
+    return found
+
+
+def strongly_connected_components(g):
+    # Iterative Tarjan; returns a component id per node and the count.
+    adj = g.adjacency()
+    n = g.num_nodes
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    comp = [-1] * n
+    stack = []
+    clock = 0
+    count = 0
+    for s in range(n):
+        if index[s] != -1:
+            continue
+        index[s] = low[s] = clock
+        clock += 1
+        stack.append(s)
+        on_stack[s] = True
+        work = [(s, iter(adj[s]))]
+        while work:
+            u, it = work[-1]
+            for v in it:
+                if index[v] == -1:
+                    index[v] = low[v] = clock
+                    clock += 1
+                    stack.append(v)
+                    on_stack[v] = True
+                    work.append((v, iter(adj[v])))
+                    break
+                if on_stack[v] and index[v] < low[u]:
+                    low[u] = index[v]
+            else:
+                work.pop()
+                if work and low[u] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[u]
+                if low[u] == index[u]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        comp[w] = count
+                        if w == u:
+                            break
+                    count += 1
+    return comp, count
@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+from collections import defaultdict
+import numpy as np
+from tqdm import tqdm
+import graph_algo
+import prompts
+import supervisor
+import task_registry
+import utils
+
+
+class GraphStore:
+    # Every sampled graph is kept once: its node count, its edge list as an
+    # (m, 3) int32 array of (u, v, w) (w is 0 for unweighted graphs) and the
+    # record it was sampled from, whose query the dataset1 questions reuse.
+    # Questions only refer to a graph by id, see question().
+    def __init__(self):
+        self.graph_ids = []
+        self.index = {}
+        self.num_nodes = []
+        self.edge_arrays = []
+        self.items = []
+
+    def __len__(self):
+        return len(self.graph_ids)
+
+    def add(self, graph_id, item, edges=None):
+        if edges is None:
+            edges = item['edges']
+        arr = np.zeros((len(edges), 3), dtype=np.int32)
+        if len(edges):
+            given = np.array(edges, dtype=np.int32)
+            arr[:, :given.shape[1]] = given
+        self.index[graph_id] = len(self.graph_ids)
+        self.graph_ids.append(graph_id)
+        self.num_nodes.append(graph_algo.extract_node_num(item['query']))
+        self.edge_arrays.append(arr)
+        # the edge list lives in the array; the key stays so rendered records
+        # keep their field order
+        self.items.append({key: None if key == 'edges' else value for key, value in item.items()})
+
+    def item(self, graph_id):
+        return self.items[self.index[graph_id]]
+
+    def edges(self, graph_id, removed_edge=None):
+        return without_edge(self.edge_arrays[self.index[graph_id]], removed_edge)
+
+    def save(self, path):
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum([len(arr) for arr in self.edge_arrays], out=offsets[1:])
+        edges = np.concatenate(self.edge_arrays) if self.edge_arrays else np.zeros((0, 3), dtype=np.int32)
+        items = "\n".join(json.dumps(item, ensure_ascii=False) for item in self.items).encode("utf-8")
+        np.savez_compressed(
+            path,
+            graph_ids=np.array(self.graph_ids, dtype=str),
+            num_nodes=np.array(self.num_nodes, dtype=np.int32),
+            edge_offsets=offsets,
+            edges=edges,
+            items=np.frombuffer(items, dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with np.load(path) as data:
+            store.graph_ids = data['graph_ids'].tolist()
+            store.num_nodes = data['num_nodes'].tolist()
+            store.edge_arrays = np.split(data['edges'], data['edge_offsets'][1:-1])
+            items = data['items'].tobytes().decode("utf-8")
+        store.index = {graph_id: i for i, graph_id in enumerate(store.graph_ids)}
+        store.items = [json.loads(line) for line in items.split("\n")] if items else []
+        return store
+
+
+def without_edge(edges, removed_edge):
+    # drops every copy of removed_edge, like remove_random_edge does
+    if removed_edge is None:
+        return edges
+    return edges[~(edges == np.array(removed_edge, dtype=np.int32)).all(axis=1)]
+
+
+def question(graph_id, task_name, dataset_type, params=None, **fields):
+    # fields holds removed_edge for the edge-removal variants of dataset2
+    # (None for the unmodified graph) and answer once it is known.
+    record = {"graph": graph_id, "task": task_name, "dataset": dataset_type, "params": params}
+    record.update(fields)
+    return record
+
+
+def render_query(store, question):
+    item = store.item(question['graph'])
+    query = item['query']
+    task_def = task_registry.get_task(question['task'])
+    params = question['params']
+    if question['dataset'] == 1 and params is None:
+        return query
+    if question['dataset'] == 1 or task_def.render is None:
+        return prompts.replace_question(query, task_def.question(*params), sentences=task_def.sentences)
+    num_nodes = store.num_nodes[store.index[question['graph']]]
+    edges = store.edges(question['graph'], question.get('removed_edge')).tolist()
+    return task_def.render(num_nodes, edges, *(params or ()))
+
+
+def render_item(store, question):
+    # The full record the generators used to write for this question.
+    item = dict(store.item(question['graph']))
+    item['query'] = render_query(store, question)
+    if 'edges' in item:
+        item['edges'] = store.edges(question['graph'], question.get('removed_edge')).tolist()
+    if 'removed_edge' in question:
+        item['removed_edge'] = question['removed_edge']
+    if question['dataset'] == 2:
+        item['task'] = question['task']
+    if 'answer' in question:
+        item['answer'] = question['answer']
+    return item
+
+
+def answer_graph(num_nodes, edges, questions):
+    # Answers every question on one stored graph, of any number of tasks,
+    # from one GraphContext: the parse and the structure the tasks derive
+    # from the graph are shared between them.
+    context = task_registry.GraphContext(num_nodes, edges)
+    by_task = defaultdict(list)
+    for i, q in enumerate(questions):
+        by_task[q['task']].append(i)
+    answers = [None] * len(questions)
+    for task_name, positions in by_task.items():
+        task_def = task_registry.get_task(task_name)
+        group = [questions[i] for i in positions]
+        if task_def.kind == task_registry.PAIR:
+            results = task_def.answer(context, [tuple(q['params']) for q in group])
+        elif task_def.kind == task_registry.VARIANT:
+            variants = [
+                context if q.get('removed_edge') is None
+                else task_registry.GraphContext(num_nodes, without_edge(edges, q['removed_edge']))
+                for q in group
+            ]
+            has_base = any('removed_edge' in q and q['removed_edge'] is None for q in group)
+            results = task_def.answer(context if has_base else None, variants)
+        else:
+            raise ValueError(f"No stored-graph oracle for task {task_name}")
+        for i, result in zip(positions, results):
+            answers[i] = result
+    return answers
+
+
+def _answer_graphs(units):
+    return [answer_graph(num_nodes, edges, questions) for num_nodes, edges, questions in units]
+
+
+def answer_questions(store, questions, cache=None, workers=1, chunks_per_worker=4, desc="Answering", budget=None):
+    # Returns the (question, reason) pairs a supervisor.Budget left
+    # unanswered; with a budget every graph is one supervised job.
+    pending = questions
+    if cache is not None:
+        pending = []
+        for q in questions:
+            answer = cache.get(q['task'], render_query(store, q))
+            if answer is None:
+                pending.append(q)
+            else:
+                q['answer'] = answer
+    groups = defaultdict(list)
+    for q in pending:
+        groups[q['graph']].append(q)
+    units = [
+        (store.num_nodes[store.index[graph_id]], store.edges(graph_id), group)
+        for graph_id, group in groups.items()
+    ]
+    unresolved = []
+    if budget is not None:
+        costs = [
+            sum(utils.task_cost(q['task'], num_nodes, len(edges)) for q in group)
+            for num_nodes, edges, group in units
+        ]
+        order = sorted(range(len(units)), key=lambda i: -costs[i])
+        jobs = [(([units[i]],), len(units[i][2])) for i in order]
+        results = supervisor.run_supervised(_answer_graphs, jobs, budget, max(workers, 1), initializer=utils._quiet_worker)
+        for j, status, result in tqdm(results, total=len(jobs), desc=desc):
+            group = units[order[j]][2]
+            if status == "ok":
+                for q, answer in zip(group, result[0]):
+                    q['answer'] = answer
+            else:
+                reason = f"error: {result}" if status == "error" else status
+                for q in group:
+                    # no answer rather than the one the question came with
+                    q.pop('answer', None)
+                    unresolved.append((q, reason))
+    elif workers > 1:
+        costs = [
+            sum(utils.task_cost(q['task'], num_nodes, len(edges)) for q in group)
+            for num_nodes, edges, group in units
+        ]
+        chunks = utils.pack_chunks(units, costs, workers * chunks_per_worker)
+        with multiprocessing.Pool(workers) as pool:
+            results = [pool.apply_async(_answer_graphs, (chunk,)) for chunk in chunks]
+            for chunk, result in zip(chunks, tqdm(results, desc=desc)):
+                for (_, _, group), answers in zip(chunk, result.get()):
+                    for q, answer in zip(group, answers):
+                        q['answer'] = answer
+    else:
+        for num_nodes, edges, group in tqdm(units, desc=desc):
+            for q, answer in zip(group, answer_graph(num_nodes, edges, group)):
+                q['answer'] = answer
+    if cache is not None:
+        skipped = {id(q) for q, _ in unresolved}
+        for q in pending:
+            if id(q) not in skipped:
+                cache.put(q['task'], render_query(store, q), q['answer'])
+        cache.commit()
+    return unresolved
+
+
+def answer_stream(store, questions, cache=None, workers=1, batch_size=10000, budget=None, unresolved=None):
+    # Questions of one graph arrive together, so batches are cut at graph
+    # boundaries and only one batch is held at a time. Questions left
+    # unanswered by the budget are appended to unresolved as
+    # {"index", "reason", "item"}, index being the position in the stream.
+    position = 0
+    for batch in utils.batches(questions, batch_size, key=lambda q: q['graph']):
+        positions = {id(q): position + i for i, q in enumerate(batch)}
+        for q, reason in answer_questions(store, batch, cache=cache, workers=workers, budget=budget):
+            if unresolved is not None:
+                unresolved.append({"index": positions[id(q)], "reason": reason, "item": q})
+        position += len(batch)
+        yield from batch
+
+
+def render_stream(store, questions):
+    for q in questions:
+        yield render_item(store, q)
@@ -0,0 +1,575 @@
+import random
+import time
+import tracemalloc
+import numpy as np
+
+
+def neighbor_masks(adj, num_nodes):
+    masks = [0] * num_nodes
+    for u, nbrs in adj.items():
+        for v in nbrs:
+            if u != v:
+                masks[u] |= 1 << v
+    return masks
+
+
+def dp_dtype(num_nodes):
+    if num_nodes <= 32:
+        return np.uint32
+    if num_nodes <= 64:
+        return np.uint64
+    raise ValueError(f"subset DP supports at most 64 nodes, got {num_nodes}")
+
+
+# subsets per step when a popcount layer is collected, which bounds the
+# temporaries of that step
+LAYER_CHUNK = 1 << 16
+
+
+def dp_memory_bytes(num_nodes):
+    # dp table + popcount table + the widest popcount layer: while a layer is
+    # extended by one node it is held with its path ends, a scratch copy, the
+    # selected subsets, the dp values read through them, two bool masks and
+    # the intp index numpy converts the selection to + one LAYER_CHUNK step
+    # of collecting a layer + 64 KiB for the per-node arrays. The ceiling
+    # test_dp_memory checks the DP against.
+    size = 1 << num_nodes
+    itemsize = np.dtype(dp_dtype(num_nodes)).itemsize
+    widest_layer = max(_binomial(num_nodes, k) for k in range(num_nodes + 1))
+    return (size * itemsize + size + widest_layer * (5 * itemsize + 2 + 8)
+            + min(size, LAYER_CHUNK) * (1 + 8) + (1 << 16))
+
+
+def _binomial(n, k):
+    result = 1
+    for i in range(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _layer(popcount, k, count, dtype):
+    # The count subsets of popcount k in increasing order, collected
+    # LAYER_CHUNK subsets at a time so that no 2^n mask is built.
+    layer = np.empty(count, dtype=dtype)
+    filled = 0
+    for start in range(0, len(popcount), LAYER_CHUNK):
+        found = np.flatnonzero(popcount[start:start + LAYER_CHUNK] == k)
+        found += start
+        layer[filled:filled + len(found)] = found
+        filled += len(found)
+    return layer
+
+
+def _subset_dp(masks, num_nodes, max_bytes=None):
+    # dp[S] is a bitmask of the nodes v such that some path visits exactly S
+    # and ends at v. Subsets are processed in popcount layers, so layer k only
+    # touches the subsets of size k that are actually reachable.
+    ceiling = dp_memory_bytes(num_nodes)
+    if max_bytes is not None and ceiling > max_bytes:
+        raise MemoryError(f"Hamiltonian DP for {num_nodes} nodes needs {ceiling} bytes, budget is {max_bytes}")
+    dtype = dp_dtype(num_nodes)
+    size = 1 << num_nodes
+    dp = np.zeros(size, dtype=dtype)
+    bits = (np.ones(1, dtype=dtype) << np.arange(num_nodes, dtype=dtype))
+    dp[bits.astype(np.int64)] = bits
+    popcount = np.zeros(size, dtype=np.uint8)
+    for b in range(num_nodes):
+        popcount[1 << b:1 << (b + 1)] = popcount[:1 << b] + 1
+    nbr = np.array(masks, dtype=dtype)
+    for k in range(1, num_nodes):
+        layer = _layer(popcount, k, _binomial(num_nodes, k), dtype)
+        active = layer[dp[layer] != 0]
+        del layer
+        if len(active) == 0:
+            return None
+        ends = dp[active]
+        scratch = np.empty_like(active)
+        extendable = np.empty(len(active), dtype=bool)
+        free = np.empty(len(active), dtype=bool)
+        for v in range(num_nodes):
+            np.bitwise_and(ends, nbr[v], out=scratch)
+            np.not_equal(scratch, 0, out=extendable)
+            np.bitwise_and(active, bits[v], out=scratch)
+            np.equal(scratch, 0, out=free)
+            extendable &= free
+            sel = active[extendable]
+            if len(sel):
+                sel |= bits[v]
+                dp[sel] |= bits[v]
+    return dp
+
+
+def hamiltonian_path_dp(masks, num_nodes, max_bytes=None):
+    dp = _subset_dp(masks, num_nodes, max_bytes)
+    return dp is not None and bool(dp[(1 << num_nodes) - 1])
+
+
+def hamiltonian_path(masks, num_nodes, max_bytes=None):
+    # Walks the DP table backwards from the full subset to recover one path.
+    dp = _subset_dp(masks, num_nodes, max_bytes)
+    mask = (1 << num_nodes) - 1
+    if dp is None or not dp[mask]:
+        return None
+    ends = int(dp[mask])
+    end = (ends & -ends).bit_length() - 1
+    path = [end]
+    while mask != 1 << end:
+        mask ^= 1 << end
+        before = int(dp[mask]) & masks[end]
+        end = (before & -before).bit_length() - 1
+        path.append(end)
+    return path[::-1]
+
+
+# The pruned search below is fast on most graphs but exponential on some
+# structured no-instances, where the subset DP costs what it always does.
+# Up to DP_MAX_NODES nodes, when dp_memory_bytes fits DP_MAX_BYTES (or the
+# caller's max_bytes), the search gets about the DP's own work in states,
+# n 2^n cell updates at SEARCH_STATE_CELLS per state, and the DP settles
+# what it has not; small graphs go straight to the DP.
+DP_MAX_NODES = 24
+DP_MAX_BYTES = 256 << 20
+SEARCH_STATE_CELLS = 1 << 13
+
+
+class SearchLimit(Exception):
+    pass
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _reachable(masks, start, within):
+    seen = frontier = 1 << start
+    while frontier:
+        grown = 0
+        for u in _bits(frontier):
+            grown |= masks[u]
+        frontier = grown & within & ~seen
+        seen |= frontier
+    return seen
+
+
+def _cuts_ok(masks, within, root, last=None):
+    # A path that starts at root and covers `within` leaves at most two
+    # pieces when any other node c is removed (before and after c), and one
+    # piece when root is; the pieces cut off after each such c hold the end
+    # of the path, so they are nested, and hold last when the last node is
+    # already known. Checked with one DFS (Tarjan's
+    # low-points): c cuts off every child subtree whose low-point does not
+    # reach above c.
+    n = len(masks)
+    disc = [-1] * n
+    low = [0] * n
+    parent = [-1] * n
+    size = [0] * n
+    disc[root] = 0
+    seen = 1
+    cut_off = []
+    stack = [(root, masks[root] & within)]
+    while stack:
+        u, rest = stack[-1]
+        if rest:
+            bit = rest & -rest
+            stack[-1] = (u, rest ^ bit)
+            v = bit.bit_length() - 1
+            if disc[v] < 0:
+                disc[v] = low[v] = seen
+                seen += 1
+                parent[v] = u
+                stack.append((v, masks[v] & within))
+            elif v != parent[u] and disc[v] < low[u]:
+                low[u] = disc[v]
+            continue
+        stack.pop()
+        size[u] = seen - disc[u]
+        p = parent[u]
+        if p >= 0:
+            if low[u] < low[p]:
+                low[p] = low[u]
+            if low[u] >= disc[p]:
+                cut_off.append((p, u))
+    if seen != bin(within).count("1"):
+        return False
+    if sum(p == root for p, _ in cut_off) > 1:
+        return False
+    # subtrees are cut off in post-order, so nested ones come inner first
+    subtrees = [u for p, u in cut_off if p != root]
+    for inner, outer in zip(subtrees, subtrees[1:]):
+        if not disc[outer] < disc[inner] < disc[outer] + size[outer]:
+            return False
+    if last is not None and subtrees:
+        return disc[subtrees[0]] <= disc[last] < disc[subtrees[0]] + size[subtrees[0]]
+    return True
+
+
+def _count(mask):
+    return bin(mask).count("1")
+
+
+def _pieces(masks, within):
+    count = 0
+    while within:
+        seen = _reachable(masks, (within & -within).bit_length() - 1, within)
+        within &= ~seen
+        count += 1
+    return count
+
+
+def _scattered(masks, num_nodes, degree):
+    # Cheap No-certificates for a connected graph, tried before the search
+    # backtracks: a path through every node leaves at most |S| + 1 pieces
+    # when the nodes of S are removed. S runs over the nodes of degree at
+    # least t for every t (the small side of K_{a,a+2}, the centre of three
+    # cliques), and for a bipartite graph over its smaller side, which fails
+    # exactly when the sides differ by more than one.
+    full = (1 << num_nodes) - 1
+    for t in sorted(set(degree), reverse=True)[:-1]:
+        removed = 0
+        for u in range(num_nodes):
+            if degree[u] >= t:
+                removed |= 1 << u
+        if _pieces(masks, full & ~removed) > _count(removed) + 1:
+            return True
+    # sides by the parity of the distance from node 0
+    side = [1, 0]
+    seen = frontier = 1
+    parity = 0
+    while frontier:
+        grown = 0
+        for u in _bits(frontier):
+            grown |= masks[u]
+        frontier = grown & full & ~seen
+        seen |= frontier
+        parity ^= 1
+        side[parity] |= frontier
+    if any(masks[u] & side[p] for p in (0, 1) for u in _bits(side[p])):
+        return False
+    return abs(_count(side[0]) - _count(side[1])) > 1
+
+
+def _propagate(masks, end, remaining):
+    # Edge propagation for a path that starts at end and covers remaining:
+    # every remaining node uses two of its edges except the last node, which
+    # uses one. Returns the edges still usable (a mask per node) and the
+    # candidates for the last node, or None if no such path exists.
+    # - a node with two usable edges that cannot be last uses both, a node
+    #   with one must be last; a node whose forced edges fill it loses the
+    #   rest
+    # - forced edges may not close a cycle
+    # - a node forced by more neighbours than it has room for is relieved
+    #   only if one of them is last, which narrows the candidates
+    within = remaining | 1 << end
+    usable = {u: masks[u] & within for u in _bits(within)}
+    forced = dict.fromkeys(usable, 0)
+    root = {u: u for u in usable}
+    last = remaining
+
+    def find(u):
+        while root[u] != u:
+            root[u] = root[root[u]]
+            u = root[u]
+        return u
+
+    changed = True
+    while changed:
+        changed = False
+        for u in usable:
+            cap = 1 if u == end or last == 1 << u else 2
+            free = usable[u] & ~forced[u]
+            have = _count(forced[u])
+            if have > cap:
+                return None
+            if have == cap:
+                if free:
+                    usable[u] ^= free
+                    for v in _bits(free):
+                        usable[v] &= ~(1 << u)
+                    changed = True
+                continue
+            size = _count(usable[u])
+            if size < cap:
+                if size == 0 or u == end or not last >> u & 1:
+                    return None
+                # one usable edge: u is the last node
+                last = 1 << u
+                cap = 1
+                changed = True
+            if size == cap and (cap == 1 or not last >> u & 1):
+                for v in _bits(free):
+                    a, b = find(u), find(v)
+                    if a == b:
+                        return None
+                    root[a] = b
+                    forced[u] |= 1 << v
+                    forced[v] |= 1 << u
+                changed = True
+        excess = 0
+        for w in usable:
+            cap = 1 if w == end or last == 1 << w else 2
+            relief = 0
+            for u in _bits(usable[w] & ~forced[w] & last):
+                if _count(usable[u]) == 2:
+                    relief |= 1 << u
+            over = _count(forced[w]) + _count(relief) - cap
+            if over > 0:
+                excess += over
+                if excess > 1:
+                    return None
+                if last & ~relief:
+                    last &= relief
+                    changed = True
+        if not last:
+            return None
+    return usable, last
+
+
+def _next_steps(masks, end, remaining, rank):
+    # Nodes the path may move to next from end, most constrained first (ties
+    # broken by rank), or
+    # None when the rest of the graph cannot be covered from end: the edges
+    # left by _propagate must keep the remaining nodes connected and, with
+    # end, pass the articulation check in _cuts_ok.
+    if remaining & (remaining - 1) == 0:
+        return [remaining.bit_length() - 1] if masks[end] & remaining else None
+    propagated = _propagate(masks, end, remaining)
+    if propagated is None:
+        return None
+    usable, last = propagated
+    reduced = list(masks)
+    for u, mask in usable.items():
+        reduced[u] = mask
+    if not _cuts_ok(reduced, remaining | 1 << end, end, last.bit_length() - 1 if last & (last - 1) == 0 else None):
+        return None
+    return sorted(_bits(usable[end]), key=lambda u: (_count(usable[u]), rank[u]))
+
+
+def hamiltonian_path_search(masks, num_nodes, seed=0, max_states=None):
+    # Backtracking over path extensions with the pruning of _next_steps,
+    # after the certificates of _scattered.
+    # (end, visited) states that failed once are remembered: whether the
+    # rest can be covered does not depend on how the path got there. A
+    # degree-1 node must be an end of the path, so the search starts there.
+    # One bad early step can cost a long detour, so the search restarts with
+    # a doubled step limit and its ties broken in a new random order; failed
+    # states carry over, so the last run finishes what the others began.
+    # With max_states, SearchLimit is raised once the runs together expanded
+    # that many states without an answer.
+    full = (1 << num_nodes) - 1
+    if num_nodes == 1:
+        return [0]
+    degree = [_count(masks[u] & full) for u in range(num_nodes)]
+    if min(degree) == 0:
+        return None
+    ends = [u for u in range(num_nodes) if degree[u] == 1]
+    if len(ends) > 2:
+        return None
+    if _reachable(masks, 0, full) != full:
+        return None
+    if _scattered(masks, num_nodes, degree):
+        return None
+    dead = set()
+    path = []
+    # states expanded so far, and where the current run stops
+    expanded = [0, 0]
+    rng = random.Random(seed)
+    rank = list(range(num_nodes))
+
+    def extend(end, visited):
+        # True when path was completed, False when this state is dead and
+        # None when the step limit ran out
+        if visited == full:
+            return True
+        if (end, visited) in dead:
+            return False
+        if expanded[0] >= expanded[1]:
+            return None
+        expanded[0] += 1
+        for u in _next_steps(masks, end, full & ~visited, rank) or ():
+            path.append(u)
+            found = extend(u, visited | 1 << u)
+            if found is not False:
+                return found
+            path.pop()
+        dead.add((end, visited))
+        return False
+
+    limit = 10 * num_nodes
+    while True:
+        expanded[1] = expanded[0] + limit
+        if max_states is not None:
+            if expanded[0] >= max_states:
+                raise SearchLimit(f"no answer after {expanded[0]} states")
+            expanded[1] = min(expanded[1], max_states)
+        starts = ends[:1] if ends else sorted(range(num_nodes), key=lambda u: (degree[u], rank[u]))
+        for start in starts:
+            path[:] = [start]
+            found = extend(start, 1 << start)
+            if found:
+                return path
+            if found is None:
+                break
+        else:
+            return None
+        limit *= 2
+        rng.shuffle(rank)
+
+
+def find_hamiltonian_path(masks, num_nodes, max_bytes=None):
+    # One path or None: the pruned search, handing over to the subset DP
+    # where that fits (see DP_MAX_NODES).
+    if num_nodes > DP_MAX_NODES or dp_memory_bytes(num_nodes) > (DP_MAX_BYTES if max_bytes is None else max_bytes):
+        return hamiltonian_path_search(masks, num_nodes)
+    max_states = (num_nodes << num_nodes) // SEARCH_STATE_CELLS
+    if max_states >= num_nodes:
+        try:
+            return hamiltonian_path_search(masks, num_nodes, max_states=max_states)
+        except SearchLimit:
+            pass
+    return hamiltonian_path(masks, num_nodes, max_bytes)
+
+
+def dp_peak_bytes(masks, num_nodes):
+    # what one DP run allocates at most, by tracemalloc
+    tracemalloc.start()
+    try:
+        hamiltonian_path(masks, num_nodes)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_dp_memory(max_nodes=20, num_random=30):
+    # measured DP peaks against dp_memory_bytes, on complete graphs (every
+    # subset of every layer is extended) and random ones
+    rng = random.Random(0)
+    cases = [(n, [((1 << n) - 1) & ~(1 << u) for u in range(n)]) for n in range(1, max_nodes + 1)]
+    for _ in range(num_random):
+        num_nodes = rng.randint(2, max_nodes)
+        adj = {u: [] for u in range(num_nodes)}
+        for u in range(num_nodes):
+            for v in range(u + 1, num_nodes):
+                if rng.random() < 0.3:
+                    adj[u].append(v)
+                    adj[v].append(u)
+        cases.append((num_nodes, neighbor_masks(adj, num_nodes)))
+    over = 0
+    for num_nodes, masks in cases:
+        peak = dp_peak_bytes(masks, num_nodes)
+        if peak > dp_memory_bytes(num_nodes):
+            over += 1
+            print(f"nodes={num_nodes}: DP peak {peak} above the bound {dp_memory_bytes(num_nodes)}")
+    print(f"Checked {len(cases)} DP runs, {over} above dp_memory_bytes")
+    return over == 0
+
+
+def _hard_graphs(max_nodes, rng):
+    # (name, adjacency) of families the random graphs never reach, mostly
+    # no-instances on which the plain search backtracks exponentially:
+    # K_{a,b} and split graphs with a few edges added on the larger side,
+    # cliques hanging off one cut vertex, barbells
+    def graph(num_nodes, edges):
+        adj = {u: [] for u in range(num_nodes)}
+        for u, v in edges:
+            if u != v and v not in adj[u]:
+                adj[u].append(v)
+                adj[v].append(u)
+        return adj
+
+    def sprinkle(nodes, count):
+        return [tuple(rng.sample(nodes, 2)) for _ in range(count)] if len(nodes) > 1 else []
+
+    def clique(nodes):
+        return [(u, v) for i, u in enumerate(nodes) for v in nodes[i + 1:]]
+
+    for a in range(1, max_nodes // 2):
+        for b in range(a, min(a + 4, max_nodes - a + 1)):
+            large = list(range(a, a + b))
+            edges = [(u, v) for u in range(a) for v in large]
+            for extra in range(3):
+                yield f"K_{a},{b}+{extra}", graph(a + b, edges + sprinkle(large, extra))
+                yield f"split_{a},{b}+{extra}", graph(a + b, edges + clique(list(range(a))) + sprinkle(large, extra))
+    for k in range(2, 8):
+        for branches in (2, 3, 4):
+            if 1 + branches * k <= max_nodes:
+                edges = []
+                for i in range(branches):
+                    nodes = list(range(1 + i * k, 1 + (i + 1) * k))
+                    edges += clique(nodes) + [(0, nodes[0]), (0, nodes[-1])]
+                yield f"cut_{branches}x{k}", graph(1 + branches * k, edges)
+        for bridge in range(1, 4):
+            if 2 * k + bridge <= max_nodes:
+                path = list(range(k - 1, k + bridge + 1))
+                edges = clique(list(range(k))) + clique(list(range(k + bridge, 2 * k + bridge)))
+                yield f"barbell_{k}+{bridge}", graph(2 * k + bridge, edges + list(zip(path, path[1:])))
+
+
+def test_hard_instances(max_nodes=22):
+    # find_hamiltonian_path against the DP on _hard_graphs, nodes relabelled
+    # at random; also reports the slowest graph
+    rng = random.Random(0)
+    mismatches = 0
+    slowest = (0.0, None)
+    cases = 0
+    for name, adj in _hard_graphs(max_nodes, rng):
+        num_nodes = len(adj)
+        order = rng.sample(range(num_nodes), num_nodes)
+        masks = neighbor_masks({order[u]: [order[v] for v in nbrs] for u, nbrs in adj.items()}, num_nodes)
+        start = time.perf_counter()
+        path = find_hamiltonian_path(masks, num_nodes)
+        elapsed = time.perf_counter() - start
+        slowest = max(slowest, (elapsed, name))
+        expected = hamiltonian_path_dp(masks, num_nodes)
+        valid = path is None or (
+            sorted(path) == list(range(num_nodes))
+            and all(masks[u] >> v & 1 for u, v in zip(path, path[1:]))
+        )
+        if (path is not None) != expected or not valid:
+            mismatches += 1
+            print(f"Mismatch on {name}: expected {expected}, got {path}")
+        cases += 1
+    print(f"Checked {cases} hard graphs, {mismatches} mismatches; slowest {slowest[1]} in {slowest[0]:.3f}s")
+    return mismatches == 0
+
+
+def main():
+    random.seed(0)
+    for num_nodes in list(range(16, 26)) + [40, 60, 80, 100]:
+        adj = {u: [] for u in range(num_nodes)}
+        for u in range(num_nodes):
+            for v in range(u + 1, num_nodes):
+                if random.random() < min(0.2, 4 / num_nodes):
+                    adj[u].append(v)
+                    adj[v].append(u)
+        if num_nodes > 25:
+            # sparse graphs this size rarely have a path by chance; plant one
+            order = random.sample(range(num_nodes), num_nodes)
+            for u, v in zip(order, order[1:]):
+                if v not in adj[u]:
+                    adj[u].append(v)
+                    adj[v].append(u)
+        masks = neighbor_masks(adj, num_nodes)
+        start = time.perf_counter()
+        path = hamiltonian_path_search(masks, num_nodes)
+        elapsed = time.perf_counter() - start
+        print(f"nodes={num_nodes} search: found={path is not None} time={elapsed:.3f}s")
+        if num_nodes > 25:
+            continue
+        start = time.perf_counter()
+        found = hamiltonian_path_dp(masks, num_nodes)
+        elapsed = time.perf_counter() - start
+        peak = dp_peak_bytes(masks, num_nodes)
+        print(
+            f"nodes={num_nodes} dp: found={found} time={elapsed:.2f}s "
+            f"peak={peak / 2 ** 20:.1f}MiB ceiling={dp_memory_bytes(num_nodes) / 2 ** 20:.1f}MiB"
+        )
+
+
+if __name__ == "__main__":
+    test_dp_memory()
+    test_hard_instances()
+    main()
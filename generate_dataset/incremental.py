@@ -0,0 +1,172 @@
+import graph_algo
+import graph_csr
+
+
+def undirected_edge_set(edges):
+    return {(min(edge[0], edge[1]), max(edge[0], edge[1])) for edge in edges}
+
+
+def directed_edge_set(edges):
+    return {(edge[0], edge[1]) for edge in edges}
+
+
+def coloring_forest(g):
+    # DFS 2-coloring that also records the spanning forest and every non-tree
+    # edge whose endpoints received the same color (including self-loops).
+    adj = g.undirected().adjacency()
+    color = [-1] * g.num_nodes
+    tree = set()
+    conflicts = set()
+    for s in range(g.num_nodes):
+        if color[s] != -1:
+            continue
+        color[s] = 0
+        stack = [s]
+        while stack:
+            u = stack.pop()
+            for v in adj[u]:
+                if color[v] == -1:
+                    color[v] = 1 - color[u]
+                    tree.add((min(u, v), max(u, v)))
+                    stack.append(v)
+                elif color[v] == color[u]:
+                    conflicts.add((min(u, v), max(u, v)))
+    return tree, conflicts
+
+
+class VariantOracle:
+    # Answers the cycle / bipartite / topology / hamilton question for copies
+    # of one base graph with a single edge removed, by updating facts derived
+    # once from the base graph. Anything it cannot decide from those facts
+    # (an added edge, several removed edges, a removal that touches the
+    # certificate) falls back to the full oracle. context, a
+    # tasks.GraphContext of the base graph, supplies structure other tasks
+    # already derived from it.
+    def __init__(self, task_name, base_edges, num_nodes=None, context=None):
+        self.task_name = task_name
+        self.num_nodes = num_nodes
+        self.context = context
+        if task_name == 'topology':
+            self.base_set = directed_edge_set(base_edges)
+        else:
+            self.base_set = undirected_edge_set(base_edges)
+        getattr(self, f"_analyze_{task_name}")(base_edges)
+
+    def answer(self, edges, num_nodes=None):
+        if self.task_name == 'hamilton' and num_nodes != self.num_nodes:
+            return self._full(edges, num_nodes)
+        if self.task_name == 'topology':
+            variant_set = directed_edge_set(edges)
+        else:
+            variant_set = undirected_edge_set(edges)
+        if not variant_set <= self.base_set:
+            return self._full(edges, num_nodes)
+        removed = self.base_set - variant_set
+        if len(removed) > 1:
+            return self._full(edges, num_nodes)
+        return getattr(self, f"_update_{self.task_name}")(edges, num_nodes, removed.pop() if removed else None)
+
+    def _full(self, edges, num_nodes):
+        if self.task_name == 'cycle':
+            return graph_algo.has_cycle(edges)
+        if self.task_name == 'bipartite':
+            return graph_algo.is_bipartite(edges)
+        if self.task_name == 'topology':
+            return graph_algo.topological_sort(edges)
+        if self.task_name == 'hamilton':
+            return graph_algo.has_hamiltonian_path(edges, num_nodes)
+        raise ValueError(f"No incremental oracle for task {self.task_name}")
+
+    def _label_pairs(self, g, pairs):
+        labels = g.labels
+        return {(min(labels[u], labels[v]), max(labels[u], labels[v])) for u, v in pairs}
+
+    def _analyze_cycle(self, edges):
+        # cyclomatic number m - n + c of the simple graph: removing a bridge
+        # keeps it, removing any other edge lowers it by one
+        if self.context is not None:
+            g = self.context.undirected()
+            self.cyclomatic = len(self.base_set) - g.num_nodes + self.context.components()[1]
+            self.bridges = self.context.bridges()
+        else:
+            g = graph_csr.build_csr(edges)
+            self.cyclomatic = len(self.base_set) - g.num_nodes + graph_csr.connected_components(g)[1]
+            self.bridges = self._label_pairs(g, graph_csr.bridges(g))
+        self.base_answer = "### Yes" if self.cyclomatic > 0 else "### No"
+
+    def _update_cycle(self, edges, num_nodes, removed):
+        if removed is None:
+            return self.base_answer
+        cyclomatic = self.cyclomatic if removed in self.bridges else self.cyclomatic - 1
+        return "### Yes" if cyclomatic > 0 else "### No"
+
+    def _directed(self, edges):
+        if self.context is not None:
+            return self.context.directed()
+        return graph_csr.build_csr(edges, directed=True)
+
+    def _analyze_bipartite(self, edges):
+        g = self._directed(edges)
+        tree, conflicts = coloring_forest(g)
+        self.tree = self._label_pairs(g, tree)
+        self.conflicts = self._label_pairs(g, conflicts)
+        self.base_answer = "### No" if self.conflicts else "### Yes"
+
+    def _update_bipartite(self, edges, num_nodes, removed):
+        if removed is None or not self.conflicts:
+            return self.base_answer
+        if removed in self.tree:
+            return self._full(edges, num_nodes)
+        return "### No" if self.conflicts - {removed} else "### Yes"
+
+    def _analyze_topology(self, edges):
+        g = self._directed(edges)
+        self.acyclic = graph_csr.topological_order(g) is not None
+        if self.acyclic:
+            return
+        comp, _ = graph_csr.strongly_connected_components(g)
+        self.cyclic_arcs = {(u, v) for u, v in self.base_set if comp[g.index[u]] == comp[g.index[v]]}
+        units = {comp[g.index[u]] for u, v in self.cyclic_arcs if u != v}
+        loops = {u for u, v in self.cyclic_arcs if u == v}
+        self.independent_cycles = len(units) + len(loops)
+        self.base_answer = "### The graph has rings and cannot be topologically sorted"
+
+    def _update_topology(self, edges, num_nodes, removed):
+        # The order itself depends on the variant's edge order, so acyclic
+        # variants always re-run Kahn; only the cyclic verdict is incremental.
+        if self.acyclic:
+            return graph_algo.topological_sort(edges)
+        if removed is None or removed not in self.cyclic_arcs or self.independent_cycles > 1:
+            return self.base_answer
+        return self._full(edges, num_nodes)
+
+    def _analyze_hamilton(self, edges):
+        # Every Hamiltonian path found so far (for the base or a variant) is
+        # kept; a variant is Yes as soon as one of them avoids its removed edge.
+        if self.context is not None:
+            self.bridges = self.context.bridges()
+            self.base_answer, path = graph_algo.hamiltonian_witness(self.context.undirected(), self.num_nodes)
+        else:
+            g = graph_csr.build_csr(edges)
+            self.bridges = self._label_pairs(g, graph_csr.bridges(g))
+            self.base_answer, path = graph_algo.hamiltonian_witness(edges, self.num_nodes)
+        self.witnesses = []
+        if path is not None:
+            self.witnesses.append(self._path_edges(path))
+
+    def _path_edges(self, path):
+        return {(min(u, v), max(u, v)) for u, v in zip(path, path[1:])}
+
+    def _update_hamilton(self, edges, num_nodes, removed):
+        if removed is None or self.base_answer == "### No":
+            return self.base_answer
+        if not self.witnesses:
+            return self._full(edges, num_nodes)
+        if any(removed not in witness for witness in self.witnesses):
+            return "### Yes"
+        if removed in self.bridges:
+            return "### No"
+        answer, path = graph_algo.hamiltonian_witness(edges, num_nodes)
+        if path is not None:
+            self.witnesses.append(self._path_edges(path))
+        return answer
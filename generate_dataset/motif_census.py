@@ -0,0 +1,389 @@
+import itertools
+import random
+from collections import Counter
+import numpy as np
+import batch_kernels
+import subgraph_match
+
+# Largest motifs counted by the census: 2 counts arcs, self-loops and
+# mutual pairs, 3 adds the connected three-node motifs (paths, stars and
+# the two kinds of triangle).
+MOTIF_NODES = 3
+# patterns up to this many nodes get a canonical form (smallest edge list
+# over the relabellings that keep signature classes in order); larger ones
+# are cached by their own edge list
+CANONICAL_MAX_NODES = 7
+# (query, pattern node, target node) triples per vectorized candidate test,
+# each holding a few signature rows
+CANDIDATE_CELLS = 1 << 20
+# entries kept in each pattern cache before it is emptied and refilled
+PATTERN_CACHE_SIZE = 4096
+
+
+def _pack(edge_arrays):
+    # The graphs as one disjoint union: node v of graph g becomes
+    # offsets[g] + v. Returns the deduplicated arcs (sorted by source, then
+    # target), the graph of every packed id and the offsets.
+    sizes = [int(edges.max()) + 1 if len(edges) else 0 for edges in edge_arrays]
+    offsets = np.cumsum([0] + sizes)
+    total = max(int(offsets[-1]), 1)
+    counts = [len(edges) for edges in edge_arrays]
+    if sum(counts):
+        arcs = np.concatenate([edges.reshape(-1, 2) for edges in edge_arrays]).astype(np.int64)
+    else:
+        arcs = np.zeros((0, 2), dtype=np.int64)
+    shift = np.repeat(offsets[:-1], counts)
+    keys = np.unique((arcs[:, 0] + shift) * total + arcs[:, 1] + shift)
+    src, dst = np.divmod(keys, total)
+    graph = np.repeat(np.arange(len(sizes)), sizes)
+    return src, dst, graph, offsets
+
+
+class CensusTable:
+    # Motif counts and degree profiles of many directed graphs (int edge
+    # arrays) at once, one row per graph, computed over their disjoint union.
+    #
+    # columns: out-degree, in-degree, mutual neighbours and self-loop of
+    # every node that has an arc, grouped by graph (nodes of graph g are rows
+    # starts[g]..starts[g] + num_nodes[g]).
+    # counts: copies (as edge sets, not induced) of arcs, self-loops, mutual
+    # pairs and, for MOTIF_NODES >= 3, u -> v -> w (u != w), out-stars
+    # u -> v, u -> w and in-stars. An embedding maps the pattern's copies
+    # onto distinct copies in the target, so a target with fewer copies of
+    # any motif cannot contain the pattern.
+    # profile: each column sorted in decreasing order within the graph. The
+    # target nodes a pattern maps to are at least as large coordinate by
+    # coordinate, so the pattern's profile is bounded by the target's first
+    # rows.
+    def __init__(self, edge_arrays):
+        self.edge_arrays = edge_arrays
+        num_graphs = len(edge_arrays)
+        src, dst, graph, offsets = _pack(edge_arrays)
+        total = len(graph)
+        loop = src == dst
+        keys = src * total + dst
+        reverse = dst * total + src
+        found = np.searchsorted(keys, reverse).clip(max=max(len(keys) - 1, 0))
+        mutual_arc = ~loop & (keys[found] == reverse) if len(keys) else loop
+        present = np.zeros(total, dtype=bool)
+        present[src] = True
+        present[dst] = True
+        columns = np.column_stack([
+            np.bincount(src[~loop], minlength=total),
+            np.bincount(dst[~loop], minlength=total),
+            np.bincount(src[mutual_arc], minlength=total),
+            np.bincount(src[loop], minlength=total),
+        ])
+        ids = np.flatnonzero(present)
+        self.columns = columns[ids]
+        self.labels = ids - offsets[graph[ids]]
+        self.offsets = offsets
+        self._arcs = (src, dst, offsets[graph])
+        self._neighbours = None
+        node_graph = graph[ids]
+        self.num_nodes = np.bincount(node_graph, minlength=num_graphs)
+        self.starts = np.concatenate([[0], np.cumsum(self.num_nodes)[:-1]]).astype(np.int64)
+
+        def per_graph(values):
+            return np.bincount(node_graph, weights=values, minlength=num_graphs).astype(np.int64)
+
+        out_degree, in_degree, mutual, loops = self.columns.T
+        counts = [per_graph(out_degree), per_graph(loops), per_graph(mutual) // 2]
+        if MOTIF_NODES >= 3:
+            counts += [
+                per_graph(in_degree * out_degree) - per_graph(mutual),
+                per_graph(out_degree * (out_degree - 1) // 2),
+                per_graph(in_degree * (in_degree - 1) // 2),
+            ]
+        self.counts = np.column_stack(counts)
+        self.profile = np.column_stack([
+            column[np.lexsort((-column, node_graph))] for column in self.columns.T
+        ])
+        self._triangles = {}
+
+    def adjacency(self, row):
+        # The matcher's view of graph `row` (what subgraph_match.find_embedding
+        # reads of a DirectedAdjacency): neighbour sets are sliced out of the
+        # packed arcs the first time the matcher looks at a node.
+        if self._neighbours is None:
+            src, dst, offset = self._arcs
+            by_target = np.lexsort((src, dst))
+            ids = np.arange(len(offset) + 1)
+            self._neighbours = (
+                (dst - offset[dst]).tolist(),
+                np.searchsorted(src, ids).tolist(),
+                (src - offset[src])[by_target].tolist(),
+                np.searchsorted(dst[by_target], ids).tolist(),
+            )
+        succ_of, out_bounds, pred_of, in_bounds = self._neighbours
+        start = int(self.starts[row])
+        offset = int(self.offsets[row])
+        graph = _Adjacency()
+        graph.nodes = self.labels[start:start + self.num_nodes[row]].tolist()
+        graph.succ = _Neighbours(succ_of, out_bounds, offset)
+        graph.pred = _Neighbours(pred_of, in_bounds, offset)
+        return graph
+
+    def triangles(self, rows):
+        # (len(rows), 2): directed 3-cycles u -> v -> w -> u and feed-forward
+        # triangles u -> v -> w with u -> w, from the square of the loop-free
+        # adjacency, packed densely in blocks as in batch_kernels. Graphs too
+        # large to pack get a count no pattern exceeds, so the check passes.
+        todo = sorted({row for row in rows if row not in self._triangles})
+        sizes = [int(self.edge_arrays[row].max()) + 1 for row in todo]
+        for row, n in zip(todo, sizes):
+            if n > batch_kernels.BATCH_MAX_NODES:
+                self._triangles[row] = (np.iinfo(np.int64).max,) * 2
+        for block, n in batch_kernels.blocks(sizes, lambda n: 4 * n * n):
+            edges = [self.edge_arrays[todo[i]].reshape(-1, 2) for i in block]
+            arcs = np.concatenate(edges).astype(np.int64)
+            graph = np.repeat(np.arange(len(block)), [len(e) for e in edges])
+            keep = arcs[:, 0] != arcs[:, 1]
+            adj = np.zeros((len(block), n, n), dtype=np.float32)
+            adj[graph[keep], arcs[keep, 0], arcs[keep, 1]] = 1
+            two_step = adj @ adj
+            cycles = (two_step * adj.transpose(0, 2, 1)).sum(axis=(1, 2), dtype=np.float64) / 3
+            feed_forward = (two_step * adj).sum(axis=(1, 2), dtype=np.float64)
+            for i, c, f in zip(block, cycles.tolist(), feed_forward.tolist()):
+                self._triangles[todo[i]] = (round(c), round(f))
+        return np.array([self._triangles[row] for row in rows], dtype=np.int64).reshape(-1, 2)
+
+
+class _Adjacency:
+    # nodes, succ and pred as in subgraph_match.DirectedAdjacency; the
+    # signatures are not needed when the candidates are given
+    pass
+
+
+class _Neighbours(dict):
+    # node -> set of neighbours, built on first lookup from the slice
+    # values[bounds[i]:bounds[i + 1]] of the node's packed id i
+    def __init__(self, values, bounds, offset):
+        super().__init__()
+        self.values = values
+        self.bounds = bounds
+        self.offset = offset
+
+    def __missing__(self, node):
+        i = self.offset + node
+        neighbours = self[node] = set(self.values[self.bounds[i]:self.bounds[i + 1]])
+        return neighbours
+
+
+def canonical_form(edges):
+    # The lexicographically smallest sorted edge list over the relabellings
+    # of the nodes to 0..k-1 that keep them sorted by matcher signature (the
+    # classes are a property of the pattern, so relabelled copies still get
+    # the same form), or None when the pattern is too large.
+    graph = subgraph_match.DirectedAdjacency(edges)
+    if len(graph.nodes) > CANONICAL_MAX_NODES:
+        return None
+    classes = {}
+    for node in graph.nodes:
+        classes.setdefault(graph.signature[node], []).append(node)
+    parts = [itertools.permutations(classes[key]) for key in sorted(classes)]
+    best = None
+    for choice in itertools.product(*parts):
+        relabel = {node: i for i, node in enumerate(node for part in choice for node in part)}
+        form = tuple(sorted((relabel[u], relabel[v]) for u, v in edges))
+        if best is None or form < best:
+            best = form
+    return best
+
+
+class PatternCensus:
+    # A pattern's row of the census, with the matcher's adjacency of it and
+    # the key its answers are cached under.
+    def __init__(self, edges, key):
+        labels = {node: i for i, node in enumerate(dict.fromkeys(node for edge in edges for node in edge))}
+        table = CensusTable([np.array([(labels[u], labels[v]) for u, v in edges], dtype=np.int64)])
+        self.key = key
+        self.graph = subgraph_match.DirectedAdjacency(edges)
+        self.signatures = np.array([self.graph.signature[p] for p in self.graph.nodes], dtype=np.int64)
+        self.num_nodes = int(table.num_nodes[0])
+        self.counts = table.counts[0]
+        self.profile = table.profile
+        self.triangles = table.triangles([0])[0] if MOTIF_NODES >= 3 else np.zeros(2, dtype=np.int64)
+        self.has_triangles = bool(self.triangles.any())
+
+
+_PATTERNS = {}
+_CANONICAL = {}
+
+
+def pattern_census(pattern_edges):
+    # Cached twice: by the pattern's own edges, and by canonical form so
+    # relabelled copies of a pattern share one PatternCensus (built from the
+    # canonical edges, which the matcher then sees for every relabelling).
+    raw = tuple(sorted(set(pattern_edges)))
+    census = _PATTERNS.get(raw)
+    if census is None:
+        form = canonical_form(raw)
+        census = _CANONICAL.get(form) if form is not None else None
+        if census is None:
+            census = PatternCensus(form if form is not None else raw, form if form is not None else raw)
+            if form is not None:
+                if len(_CANONICAL) >= PATTERN_CACHE_SIZE:
+                    _CANONICAL.clear()
+                _CANONICAL[form] = census
+        if len(_PATTERNS) >= PATTERN_CACHE_SIZE:
+            _PATTERNS.clear()
+        _PATTERNS[raw] = census
+    return census
+
+
+def _compatible(table, rows, patterns):
+    # Which (graph row, pattern) queries pass every census check, as bools.
+    rows = np.array(rows, dtype=np.int64)
+    sizes = np.array([pattern.num_nodes for pattern in patterns], dtype=np.int64)
+    ok = sizes <= table.num_nodes[rows]
+    ok &= (np.array([pattern.counts for pattern in patterns]) <= table.counts[rows]).all(axis=1)
+    # profile rows of every query, against the same number of the target's
+    query = np.repeat(np.arange(len(patterns)), sizes)
+    local = np.arange(len(query)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    target = table.starts[rows][query] + np.minimum(local, table.num_nodes[rows][query] - 1)
+    needed = np.concatenate([pattern.profile for pattern in patterns])
+    worse = (needed > table.profile[target]).any(axis=1)
+    ok &= np.bincount(query[worse], minlength=len(patterns)) == 0
+    if MOTIF_NODES >= 3:
+        check = np.flatnonzero(ok & np.array([pattern.has_triangles for pattern in patterns], dtype=bool))
+        if len(check):
+            needed = np.array([patterns[i].triangles for i in check.tolist()])
+            ok[check] &= (needed <= table.triangles(rows[check].tolist())).all(axis=1)
+    return ok.tolist()
+
+
+def _candidates(table, queries):
+    # For every (row, pattern) query, the target nodes whose matcher
+    # signature dominates each pattern node's, as {pattern node: nodes}: one
+    # vectorized test over all (query, pattern node, target node) triples,
+    # in chunks of at most CANDIDATE_CELLS triples (the matcher counts a
+    # self-loop in the degrees and the mutual count).
+    signatures = np.column_stack([table.columns[:, :3] + table.columns[:, 3:], table.columns[:, 3]])
+    result = []
+    start = 0
+    while start < len(queries):
+        stop = start
+        cells = 0
+        while stop < len(queries) and (stop == start or cells + _cells(table, queries[stop]) <= CANDIDATE_CELLS):
+            cells += _cells(table, queries[stop])
+            stop += 1
+        chunk = queries[start:stop]
+        rows = np.repeat([row for row, _ in chunk], [pattern.num_nodes for _, pattern in chunk])
+        needed = np.concatenate([pattern.signatures for _, pattern in chunk])
+        sizes = table.num_nodes[rows]
+        first = np.cumsum(sizes) - sizes
+        target = np.repeat(table.starts[rows] - first, sizes) + np.arange(int(sizes.sum()))
+        fits = (signatures[target] >= np.repeat(needed, sizes, axis=0)).all(axis=1)
+        chosen = table.labels[target][fits].tolist()
+        bounds = np.concatenate([[0], np.cumsum(np.add.reduceat(fits, first))]).tolist()
+        i = 0
+        for _, pattern in chunk:
+            result.append({p: chosen[bounds[i + j]:bounds[i + j + 1]] for j, p in enumerate(pattern.graph.nodes)})
+            i += pattern.num_nodes
+        start = stop
+    return result
+
+
+def _cells(table, query):
+    row, pattern = query
+    return pattern.num_nodes * int(table.num_nodes[row])
+
+
+def contains_all(edge_arrays, pattern_edge_lists, stats=None):
+    # Answers "is pattern i a subgraph of graph i" for every i. One census
+    # row per distinct graph, answers cached per (graph, canonical pattern):
+    # queries that fail a census check are answered No without building the
+    # graph's adjacency, only the rest go to subgraph_match.find_embedding.
+    # Queries with no edges on either side have no census row and are left
+    # to subgraph_match.is_subgraph. `stats`, when given, is a Counter of how
+    # queries were settled: "cached", "rejected" by signature, "matched" or
+    # "unmatched" by the full matcher.
+    if stats is None:
+        stats = Counter()
+    answers = [None] * len(edge_arrays)
+    rows = {}
+    graphs = []
+    queries = []
+    for i, (edges, pattern_edges) in enumerate(zip(edge_arrays, pattern_edge_lists)):
+        if len(edges) == 0 or len(pattern_edges) == 0:
+            answers[i] = subgraph_match.is_subgraph(edges.tolist(), pattern_edges)
+            continue
+        key = edges.tobytes()
+        if key not in rows:
+            rows[key] = len(graphs)
+            graphs.append(edges)
+        queries.append((i, rows[key], pattern_census(pattern_edges)))
+    distinct = {}
+    for _, row, pattern in queries:
+        distinct.setdefault((row, pattern.key), pattern)
+    stats["cached"] += len(queries) - len(distinct)
+    if not distinct:
+        return answers
+    table = CensusTable(graphs)
+    keys = list(distinct)
+    ok = _compatible(table, [row for row, _ in keys], list(distinct.values()))
+    found = {}
+    by_row = {}
+    for key, passed in zip(keys, ok):
+        if passed:
+            by_row.setdefault(key[0], []).append(key)
+        else:
+            found[key] = False
+            stats["rejected"] += 1
+    survivors = [key for row_keys in by_row.values() for key in row_keys]
+    candidates = _candidates(table, [(row, distinct[(row, pattern_key)]) for row, pattern_key in survivors])
+    graph = None
+    for key, pattern_candidates in zip(survivors, candidates):
+        if graph is None or graph_row != key[0]:
+            graph_row = key[0]
+            graph = table.adjacency(graph_row)
+        found[key] = subgraph_match.find_embedding(graph, distinct[key].graph,
+                                                   pattern_candidates.__getitem__) is not None
+        stats["matched" if found[key] else "unmatched"] += 1
+    for i, row, pattern in queries:
+        answers[i] = found[(row, pattern.key)]
+    return answers
+
+
+def test_census(num_graphs=2000, patterns_per_graph=3):
+    # Same kind of cases as subgraph_match.test_is_subgraph, against the
+    # plain matcher, several patterns per graph and every pattern asked twice
+    # under different letters to exercise the canonical cache.
+    rng = random.Random(0)
+    letters = "abcdefghijklmno"
+    graphs = []
+    patterns = []
+    for _ in range(num_graphs):
+        num_nodes = rng.randint(2, 12)
+        edges = sorted({
+            (rng.randrange(num_nodes), rng.randrange(num_nodes))
+            for _ in range(rng.randint(1, num_nodes * 3))
+        })
+        for _ in range(patterns_per_graph):
+            size = rng.randint(1, 5)
+            pattern = list({
+                (rng.randrange(size), rng.randrange(size))
+                for _ in range(rng.randint(1, size * 2))
+            })
+            for _ in range(2):
+                names = rng.sample(letters, size)
+                graphs.append(edges)
+                patterns.append([(names[u], names[v]) for u, v in pattern])
+    # an empty pattern is in every graph, nothing is in an empty graph
+    graphs += [[(0, 1)], [], [], []]
+    patterns += [[], [("a", "b")], [("a", "a")], []]
+    stats = Counter()
+    answers = contains_all([np.array(edges, dtype=np.int64).reshape(-1, 2) for edges in graphs], patterns, stats)
+    mismatches = 0
+    for edges, pattern, answer in zip(graphs, patterns, answers):
+        expected = subgraph_match.is_subgraph(edges, pattern)
+        if answer != expected:
+            mismatches += 1
+            print(f"Mismatch: {edges} / {pattern}: expected {expected}")
+    print(f"Checked {len(answers)} census answers, {mismatches} mismatches; {dict(stats)}")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    test_census()
@@ -0,0 +1,80 @@
+import math
+import random
+import numpy as np
+import graph_csr
+
+
+def unordered_pair(index, num_nodes):
+    # Inverse of the row-major index of (x, y), x < y, in the upper triangle.
+    total = num_nodes * (num_nodes - 1) // 2
+    x = num_nodes - 2 - int(math.isqrt(8 * (total - 1 - index) + 1) - 1) // 2
+    y = index - (total - (num_nodes - x) * (num_nodes - x - 1) // 2) + x + 1
+    return x, y
+
+
+def ordered_pair(index, num_nodes):
+    x, r = divmod(index, num_nodes - 1)
+    return x, r + (r >= x)
+
+
+class PairSampler:
+    # Draws node pairs without replacement from a preferred pool first and a
+    # fallback pool once the preferred one is exhausted. Pools hold flat pair
+    # indices and are consumed by a partial Fisher-Yates shuffle, so each draw
+    # is O(1) and no set of used tuples is kept.
+    def __init__(self, num_nodes, ordered, preferred, fallback=(), rng=random):
+        self.num_nodes = num_nodes
+        self.ordered = ordered
+        self.rng = rng
+        self.pools = [list(preferred), list(fallback)]
+        self.remaining = [len(pool) for pool in self.pools]
+
+    def __len__(self):
+        return sum(self.remaining)
+
+    def draw(self):
+        for p, pool in enumerate(self.pools):
+            left = self.remaining[p]
+            if left:
+                i = self.rng.randrange(left)
+                index = pool[i]
+                pool[i] = pool[left - 1]
+                pool[left - 1] = index
+                self.remaining[p] = left - 1
+                if self.ordered:
+                    return ordered_pair(index, self.num_nodes)
+                return unordered_pair(index, self.num_nodes)
+        return None
+
+
+def all_pairs_sampler(num_nodes, rng=random):
+    return PairSampler(num_nodes, False, range(num_nodes * (num_nodes - 1) // 2), rng=rng)
+
+
+def component_pair_sampler(edges, num_nodes, rng=random):
+    g = graph_csr.build_csr(edges, nodes=range(num_nodes))
+    comp = np.array(graph_csr.connected_components(g)[0][:num_nodes], dtype=np.int64)
+    xs, ys = np.triu_indices(num_nodes, 1)
+    connected = comp[xs] == comp[ys]
+    return PairSampler(
+        num_nodes, False, np.flatnonzero(connected).tolist(), np.flatnonzero(~connected).tolist(), rng=rng
+    )
+
+
+def reachability_pair_sampler(edges, num_nodes, rng=random):
+    g = graph_csr.build_csr(edges, directed=True, nodes=range(num_nodes))
+    reach = graph_csr.reachability_bitsets(g)
+    reachable = []
+    unreachable = []
+    for x in range(num_nodes):
+        row = reach[x]
+        base = x * (num_nodes - 1)
+        for y in range(num_nodes):
+            if y == x:
+                continue
+            index = base + y - (y > x)
+            if row >> y & 1:
+                reachable.append(index)
+            else:
+                unreachable.append(index)
+    return PairSampler(num_nodes, True, reachable, unreachable, rng=rng)
@@ -0,0 +1,143 @@
+UNDIRECTED = "In an undirected graph, (i,j) means that node i and node j are connected with an undirected edge. "
+DIRECTED = "In a directed graph, (i->j) means that node i and node j are connected with a directed edge from node i to node j. "
+
+
+def node_range_desc(node_num):
+    return f"The nodes are numbered from 0 to {node_num - 1}"
+
+
+def undirected_edges_desc(edges):
+    return "(" + ") (".join([f"{edge[0]}, {edge[1]}" for edge in edges]) + ")"
+
+
+def directed_edges_desc(edges):
+    return "(" + ") (".join([f"{edge[0]}->{edge[1]}" for edge in edges]) + ")"
+
+
+def weighted_edges_desc(edges):
+    return "(" + ") (".join([f"{u},{v},{w}" for u, v, w in edges]) + ")"
+
+
+def weighted_directed_edges_desc(edges):
+    return "(" + ") (".join([f"{u}->{v},{w}" for u, v, w in edges]) + ")"
+
+
+def node_weights_desc(node_weights):
+    return " ".join([f"[{i}, {w}]" for i, w in node_weights])
+
+
+PATTERN_NODES = "abcdefghijklmno"
+
+
+def pattern_node(i):
+    # subgraph patterns name their nodes a, b, c, ...
+    return PATTERN_NODES[i]
+
+
+def connectivity_question(x, y):
+    return f"Is there a path between node {x} and node {y}?"
+
+
+def shortest_question(x, y):
+    return f"Give the weight of the shortest path from node {x} to node {y}."
+
+
+def flow_question(source, target):
+    return f"What is the maximum flow from node {source} to node {target}?"
+
+
+def replace_question(query, question, sentences=1):
+    # Keeps the query up to (and including) the period that ends the graph
+    # description and appends the new question. Questions ending in "." need
+    # sentences=2 to skip their own trailing period.
+    cut = len(query)
+    for _ in range(sentences):
+        cut = query.rfind('.', 0, cut)
+        if cut == -1:
+            raise ValueError("No period found")
+    return f"{query[:cut + 1]} {question}"
+
+
+def cycle_query(node_num, edges):
+    return (
+        f"Determine whether or not there is a cycle in an undirected graph. "
+        f"{UNDIRECTED}"
+        f"Given a graph, you need to output Yes or No, indicating whether there is a cycle in the graph. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {undirected_edges_desc(edges)}. Is there a cycle in this graph?"
+    )
+
+
+def connectivity_query(node_num, edges, x, y):
+    return (
+        f"Determine whether two nodes are connected in an undirected graph. "
+        f"{UNDIRECTED}"
+        f"Given a graph and a pair of nodes, you need to output Yes or No, indicating whether the node i and node j are connected. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {undirected_edges_desc(edges)}. {connectivity_question(x, y)}"
+    )
+
+
+def bipartite_query(node_num, edges):
+    return (
+        f"Determine whether or not a graph is bipartite. "
+        f"{DIRECTED}"
+        f"Given a graph, you need to output Yes or No, indicating whether the graph is bipartite. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {directed_edges_desc(edges)}. Is this graph bipartite?"
+    )
+
+
+def topology_query(node_num, edges):
+    return (
+        f"Find one of the topology sorting paths of the given graph. "
+        f"{DIRECTED}"
+        f"Given a graph, you need to output one of the topology sorting paths of the graph. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {directed_edges_desc(edges)}. Give one topology sorting path of this graph."
+    )
+
+
+def shortest_query(node_num, edges, x, y):
+    return (
+        f"Find the shortest path between two nodes in an undirected graph. "
+        f"In an undirected graph, (i,j,k) means that node i and node j are connected with an undirected edge with weight k. "
+        f"Given a graph and a pair of nodes, you need to output the weight of the shortest path between the two nodes. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {weighted_edges_desc(edges)}. {shortest_question(x, y)}"
+    )
+
+
+def hamilton_query(node_num, edges):
+    return (
+        f"Determine whether or not there is a Hamiltonian path in an undirected graph. "
+        f"{UNDIRECTED}"
+        f"Given a graph, you need to output Yes or No, indicating whether there is a Hamiltonian path in the graph. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {undirected_edges_desc(edges)}. Is there a Hamiltonian path in this graph?"
+    )
+
+
+def triangle_query(node_num, node_weights, edges):
+    return (
+        f"Find the maximum sum of the weights of three interconnected nodes. "
+        f"In an undirected graph, [i, k] means that node i has the weight k. (i,j) means that node i and node j are connected with an undirected edge. "
+        f"Given a graph, you need to output the maximum sum of the weights of three interconnected nodes. "
+        f"Q: {node_range_desc(node_num)}, weights of nodes are: {node_weights_desc(node_weights)}, "
+        f"and the edges are: {undirected_edges_desc(edges)}. What is the maximum sum of the weights of three nodes?"
+    )
+
+
+def flow_query(node_num, edges, source, target):
+    return (
+        f"Find the maximum flow between two nodes in a directed graph. "
+        f"In a directed graph, (i->j,k) means that node i and node j are connected with an directed edge from node i to node j with weight k. "
+        f"Given a graph and a pair of nodes, you need to output the maximum flow between the two nodes. "
+        f"Q: {node_range_desc(node_num)}, and the edges are: {weighted_directed_edges_desc(edges)}. {flow_question(source, target)}"
+    )
+
+
+def substructure_query(node_num, edges, pattern_num, pattern_edges):
+    pattern_desc = "(" + ") (".join([f"{pattern_node(u)}->{pattern_node(v)}" for u, v in pattern_edges]) + ")"
+    return (
+        f"Determine if a smaller graph is present as an exact match within a larger graph. "
+        f"{DIRECTED}"
+        f"Given a graph G and a subgraph G', you need to output Yes or No, indicating whether subgraph G' is present within the directed graph G. "
+        f"Q: The nodes of graph G are numbered from 0 to {node_num - 1}, and the edges are: {directed_edges_desc(edges)}. "
+        f"The nodes of subgraph G' are numbered from a to {pattern_node(pattern_num - 1)}, and the edges are: {pattern_desc}. "
+        f"Is subgraph G' present within graph G as a direct substructure?"
+    )
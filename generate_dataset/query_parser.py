@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import time
+from collections import namedtuple
+import numpy as np
+import graph_algo
+
+# Every non-digit becomes a space, so a section's numbers can be read by
+# np.fromstring in one C-level scan instead of splitting tuple by tuple.
+DIGITS_ONLY = {c: " " for c in range(128) if not chr(c).isdigit()}
+NODE_RANGE = re.compile(r'nodes are numbered from (\d+) to (\d+)')
+QUESTION_NODES = re.compile(r'node\s*(\d+).*?node\s*(\d+)')
+
+ParsedQuery = namedtuple("ParsedQuery", ["num_nodes", "edges", "weights", "node_weights", "question_nodes"])
+
+
+def numbers(text):
+    text = text.translate(DIGITS_ONLY).strip()
+    if not text:
+        return np.empty(0, dtype=np.int32)
+    return np.fromstring(text, dtype=np.int32, sep=" ")
+
+
+def parse_query(query):
+    # Splits the query once into header / edge list / question and reads each
+    # part with a single scan. edges is an (m, 2) int32 array; weights is the
+    # third tuple field for weighted formats ((i,j,k) and (i->j,k)), else None.
+    edges_start = query.find("edges are:")
+    if edges_start == -1:
+        raise ValueError("'edges are:' not found")
+    header = query[:edges_start]
+    body_start = edges_start + len("edges are:")
+    body_end = query.find(".", body_start)
+    if body_end == -1:
+        body_end = len(query)
+    body = query[body_start:body_end]
+
+    node_range = NODE_RANGE.search(header)
+    num_nodes = int(node_range.group(2)) - int(node_range.group(1)) + 1 if node_range else 0
+
+    node_weights = None
+    weights_start = header.find("weights of nodes are:")
+    if weights_start != -1:
+        node_weights = numbers(header[weights_start:]).reshape(-1, 2)
+
+    first_close = body.find(")")
+    width = len(numbers(body[:first_close])) if first_close != -1 else 2
+    flat = numbers(body)
+    if width not in (2, 3) or len(flat) % width:
+        raise ValueError("malformed edge list")
+    flat = flat.reshape(-1, width)
+    edges = flat[:, :2]
+    weights = flat[:, 2].copy() if width == 3 else None
+
+    question_nodes = None
+    question_end = query.find(".", body_end + 1)
+    match = QUESTION_NODES.search(query, body_end, question_end if question_end != -1 else len(query))
+    if match:
+        question_nodes = (int(match.group(1)), int(match.group(2)))
+    return ParsedQuery(num_nodes, edges, weights, node_weights, question_nodes)
+
+
+def parse_queries(queries):
+    return [parse_query(query) for query in queries]
+
+
+def parse_file(task_file):
+    with open(task_file, "r", encoding="utf-8") as f:
+        return parse_queries(json.loads(line)["query"] for line in f)
+
+
+def edge_tuples(parsed):
+    # The list-of-tuples form the oracles in graph_algo take.
+    if parsed.weights is None:
+        return list(map(tuple, parsed.edges.tolist()))
+    return list(zip(*parsed.edges.T.tolist(), parsed.weights.tolist()))
+
+
+def legacy_parse(task_name, query):
+    # What the callers assembled from the per-field extractors before.
+    if task_name in ('bipartite', 'topology'):
+        edges = graph_algo.extract_edges_b(query)
+    elif task_name == 'shortest':
+        edges = graph_algo.extract_edges_c(query)
+    elif task_name == 'flow':
+        edges = graph_algo.extract_edges_d(query)
+    elif task_name == 'substructure':
+        edges = graph_algo.extract_edges_subgraph(query)[0]
+    else:
+        edges = graph_algo.extract_edges_a(query)
+    num_nodes = graph_algo.extract_node_num(query)
+    node_weights = graph_algo.extract_node_weights(query) if task_name == 'triangle' else None
+    question_nodes = graph_algo.extract_nodes(query) if task_name in ('connectivity', 'shortest', 'flow') else None
+    return num_nodes, edges, node_weights, question_nodes
+
+
+def benchmark_parser(task_dir="task-list"):
+    for file_name in sorted(os.listdir(task_dir)):
+        task_name = file_name[:-len(".json")]
+        with open(os.path.join(task_dir, file_name), "r", encoding="utf-8") as f:
+            queries = [json.loads(line)["query"] for line in f]
+        start = time.perf_counter()
+        expected = [legacy_parse(task_name, query) for query in queries]
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parsed = parse_queries(queries)
+        parse_time = time.perf_counter() - start
+        mismatches = 0
+        for (num_nodes, edges, node_weights, question_nodes), p in zip(expected, parsed):
+            if edge_tuples(p) != edges:
+                mismatches += 1
+            elif num_nodes != p.num_nodes:
+                mismatches += 1
+            elif node_weights is not None and p.node_weights.tolist() != node_weights:
+                mismatches += 1
+            elif question_nodes is not None and p.question_nodes != question_nodes:
+                mismatches += 1
+        print(
+            f"{task_name}: {len(queries)} queries, extractors {len(queries) / legacy_time:.0f}/s, "
+            f"parse_queries {len(queries) / parse_time:.0f}/s ({legacy_time / parse_time:.1f}x), "
+            f"{mismatches} mismatches"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_parser()
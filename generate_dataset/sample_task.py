@@ -1,7 +1,7 @@
 import json
-import random
 from pathlib import Path
 import os
+import sampling
 
 
 def load_data(task_file):
@@ -15,48 +15,34 @@ def save_data(data, output_file):
             f.write(json.dumps(item, ensure_ascii=False) + "\n")
 
 
-def sample_tasks(task_file, sampled_file, num_samples):
-    tasks = load_data(task_file)
-
+def run_sampling(task_file, sampled_file, sample_sizes, num_runs):
+    # Every run of every size is drawn without replacement from a single
+    # StratifiedSampler pass over task_file; results and the accumulated
+    # sampled_file are written once at the end.
     if Path(sampled_file).exists():
         sampled_tasks = load_data(sampled_file)
-        sampled_set = set(json.dumps(item, sort_keys=True) for item in sampled_tasks)
     else:
-        sampled_set = set()
-
-    remaining_tasks = [task for task in tasks if json.dumps(task, sort_keys=True) not in sampled_set]
-
-    if len(remaining_tasks) < num_samples:
-        raise ValueError(f"Not enough remaining samples to sample {num_samples} items. Remaining: {len(remaining_tasks)}")
-
-    sampled = random.sample(remaining_tasks, num_samples)
-
-    sampled_set.update(json.dumps(task, sort_keys=True) for task in sampled)
-    save_data([json.loads(item) for item in sampled_set], sampled_file)
-
-    return sampled
-
-
-def run_sampling(task_file, sampled_file, sample_sizes, num_runs):
+        sampled_tasks = []
+    sampler = sampling.StratifiedSampler(
+        task_file, exclude=[sampling.sampled_record_hash(item) for item in sampled_tasks]
+    )
     results = []
 
     for size in sample_sizes:
         for run in range(num_runs):
-            try:
-                if size == 0:
-                    sampled = []
-                else:
-                    sampled = sample_tasks(task_file, sampled_file, size)
-                results.append({
-                    "sample_size": size,
-                    "run": run + 1,
-                    "sampled_tasks": sampled
-                })
-                print(f"Sampled {size} items, run {run + 1} completed")
-            except ValueError as e:
-                print(e)
+            if size > sampler.available():
+                print(f"Not enough remaining samples to sample {size} items. Remaining: {sampler.available()}")
                 break
-
+            sampled = sampler.sample(size)
+            sampled_tasks.extend(sampled)
+            results.append({
+                "sample_size": size,
+                "run": run + 1,
+                "sampled_tasks": sampled
+            })
+            print(f"Sampled {size} items, run {run + 1} completed")
+
+    save_data(sampled_tasks, sampled_file)
     save_data(results, f"{sample_path}/{task_name}_sampling_results.json")
     print(f"All sampling results saved to {sample_path}/{task_name}_sampling_results.json")
 
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import random
+import graph_algo
+
+# keys the samplers add to a task record; a record is identified without them
+SAMPLED_KEYS = ('graph', 'complexity', 'edges')
+
+
+def line_hash(line):
+    return hashlib.sha256(line.rstrip(b"\r\n")).digest()
+
+
+def sampled_record_hash(item):
+    # task shards are written with json.dumps(item, ensure_ascii=False), so a
+    # sampled record minus the keys added by sampling hashes like its line
+    item = {key: value for key, value in item.items() if key not in SAMPLED_KEYS}
+    return line_hash(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+
+
+def complexity(node_num):
+    if 5 <= node_num <= 35:
+        return "easy"
+    elif 35 < node_num <= 65:
+        return "middle"
+    elif 65 < node_num <= 100:
+        return "hard"
+    return "unknown"
+
+
+class StratifiedSampler:
+    # One pass over a task file: each distinct record is hashed once and put
+    # in the bucket of its node count, and every bucket is shuffled once.
+    # sample() then draws without replacement across all calls by popping
+    # from buckets chosen in proportion to what they have left, which is a
+    # uniform draw over the qualifying records. Records are read back by byte
+    # offset only once they are drawn.
+    def __init__(self, task_file, exclude=(), node_nums=None, rng=random):
+        self.task_file = task_file
+        self.rng = rng
+        self.offsets = []
+        self.buckets = {}
+        seen = set(exclude)
+        offset = 0
+        position = 0
+        with open(task_file, "rb") as f:
+            for line in f:
+                if line.strip():
+                    digest = line_hash(line)
+                    if digest not in seen:
+                        seen.add(digest)
+                        if node_nums is not None:
+                            node_num = int(node_nums[position])
+                        else:
+                            node_num = graph_algo.extract_node_num(json.loads(line)["query"])
+                        self.buckets.setdefault(node_num, []).append(len(self.offsets))
+                        self.offsets.append(offset)
+                    position += 1
+                offset += len(line)
+        for bucket in self.buckets.values():
+            rng.shuffle(bucket)
+
+    def available(self, node_num_min=None, node_num_max=None):
+        return sum(len(bucket) for node_num, bucket in self._pools(node_num_min, node_num_max))
+
+    def _pools(self, node_num_min, node_num_max):
+        return [
+            (node_num, bucket) for node_num, bucket in sorted(self.buckets.items())
+            if bucket
+            and (node_num_min is None or node_num >= node_num_min)
+            and (node_num_max is None or node_num <= node_num_max)
+        ]
+
+    def sample_ids(self, num_samples, node_num_min=None, node_num_max=None):
+        pools = self._pools(node_num_min, node_num_max)
+        total = sum(len(bucket) for _, bucket in pools)
+        ids = []
+        for _ in range(min(num_samples, total)):
+            r = self.rng.randrange(total)
+            for _, bucket in pools:
+                if r < len(bucket):
+                    ids.append(bucket.pop())
+                    break
+                r -= len(bucket)
+            total -= 1
+        return ids
+
+    def records(self, ids):
+        with open(self.task_file, "rb") as f:
+            for i in ids:
+                f.seek(self.offsets[i])
+                yield json.loads(f.readline())
+
+    def sample(self, num_samples, node_num_min=None, node_num_max=None):
+        return list(self.records(self.sample_ids(num_samples, node_num_min, node_num_max)))
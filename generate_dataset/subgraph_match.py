@@ -0,0 +1,180 @@
+import os
+import random
+import itertools
+
+
+class DirectedAdjacency:
+    def __init__(self, edges):
+        self.succ = {}
+        self.pred = {}
+        for u, v in edges:
+            self.succ.setdefault(u, set()).add(v)
+            self.pred.setdefault(v, set()).add(u)
+            self.succ.setdefault(v, set())
+            self.pred.setdefault(u, set())
+        self.nodes = list(self.succ)
+        self.signature = {node: self._signature(node) for node in self.nodes}
+        # match order when used as a pattern, filled in by _match_order
+        self.order = None
+
+    def _signature(self, node):
+        succ = self.succ[node]
+        pred = self.pred[node]
+        return len(succ), len(pred), len(succ & pred), node in succ
+
+    def has_edge(self, u, v):
+        return v in self.succ[u]
+
+
+def _dominates(target_sig, pattern_sig):
+    return (
+        target_sig[0] >= pattern_sig[0]
+        and target_sig[1] >= pattern_sig[1]
+        and target_sig[2] >= pattern_sig[2]
+        and (target_sig[3] or not pattern_sig[3])
+    )
+
+
+def _match_order(pattern):
+    # VF2++-style ordering: start from the most connected pattern node, then
+    # always take the node with the most edges into the already ordered set.
+    if pattern.order is not None:
+        return pattern.order
+    remaining = set(pattern.nodes)
+    order = []
+    placed = set()
+
+    def degree(node):
+        return len(pattern.succ[node]) + len(pattern.pred[node])
+
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda node: (
+                len((pattern.succ[node] | pattern.pred[node]) & placed),
+                degree(node),
+            ),
+        )
+        order.append(best)
+        placed.add(best)
+        remaining.remove(best)
+    pattern.order = order
+    return order
+
+
+def find_embedding(target, pattern, candidates=None):
+    # candidates(p), when given, lists the target nodes whose signature
+    # dominates pattern node p's, in target.nodes order
+    if len(pattern.nodes) > len(target.nodes):
+        return None
+    order = _match_order(pattern)
+    if candidates is None:
+        candidates = {
+            p: [m for m in target.nodes if _dominates(target.signature[m], pattern.signature[p])]
+            for p in order
+        }
+    else:
+        candidates = {p: candidates(p) for p in order}
+    if any(not candidates[p] for p in order):
+        return None
+    mapping = {}
+    used = set()
+
+    def consistent(p, m):
+        for q, n in mapping.items():
+            if q in pattern.succ[p] and n not in target.succ[m]:
+                return False
+            if q in pattern.pred[p] and n not in target.pred[m]:
+                return False
+        return True
+
+    def extend(depth):
+        if depth == len(order):
+            return True
+        p = order[depth]
+        pool = candidates[p]
+        # narrow the pool through an already mapped neighbor when there is one
+        for q in pattern.pred[p]:
+            if q in mapping:
+                pool = [m for m in target.succ[mapping[q]] if m in candidates_set[p]]
+                break
+        else:
+            for q in pattern.succ[p]:
+                if q in mapping:
+                    pool = [m for m in target.pred[mapping[q]] if m in candidates_set[p]]
+                    break
+        for m in pool:
+            if m in used or not consistent(p, m):
+                continue
+            mapping[p] = m
+            used.add(m)
+            if extend(depth + 1):
+                return True
+            del mapping[p]
+            used.remove(m)
+        return False
+
+    candidates_set = {p: set(pool) for p, pool in candidates.items()}
+    if extend(0):
+        return dict(mapping)
+    return None
+
+
+def is_subgraph(G_edges, G_prime_edges):
+    target = DirectedAdjacency(G_edges)
+    pattern = DirectedAdjacency(G_prime_edges)
+    return find_embedding(target, pattern) is not None
+
+
+def is_subgraph_bruteforce(G_edges, G_prime_edges):
+    # every injective mapping of the pattern's nodes, as a reference for
+    # find_embedding on small graphs
+    G_nodes = list(dict.fromkeys(node for edge in G_edges for node in edge))
+    G_prime_nodes = list(dict.fromkeys(node for edge in G_prime_edges for node in edge))
+    if len(G_prime_nodes) > len(G_nodes):
+        return False
+    G_edge_set = set(G_edges)
+    for mapping_nodes in itertools.permutations(G_nodes, len(G_prime_nodes)):
+        mapping = dict(zip(G_prime_nodes, mapping_nodes))
+        if all((mapping[u], mapping[v]) in G_edge_set for u, v in G_prime_edges):
+            return True
+    return False
+
+
+def test_is_subgraph(task_file="task-list/substructure.json", max_target_nodes=12, num_random=500):
+    cases = []
+    if os.path.exists(task_file):
+        # graph_algo imports this module for its oracle
+        import graph_algo
+        from utils import load_data
+        for task in load_data(task_file):
+            edges1, edges2 = graph_algo.extract_edges_subgraph(task["query"])
+            if len({node for edge in edges1 for node in edge}) <= max_target_nodes:
+                cases.append((edges1, edges2))
+    rng = random.Random(0)
+    letters = "abcdefghijklmno"
+    for _ in range(num_random):
+        num_nodes = rng.randint(2, 9)
+        edges1 = list({
+            (rng.randrange(num_nodes), rng.randrange(num_nodes))
+            for _ in range(rng.randint(1, num_nodes * 3))
+        })
+        size = rng.randint(1, 4)
+        edges2 = list({
+            (letters[rng.randrange(size)], letters[rng.randrange(size)])
+            for _ in range(rng.randint(1, size * 2))
+        })
+        cases.append((edges1, edges2))
+    mismatches = 0
+    for edges1, edges2 in cases:
+        expected = is_subgraph_bruteforce(edges1, edges2)
+        actual = is_subgraph(edges1, edges2)
+        if expected != actual:
+            mismatches += 1
+            print(f"Mismatch: {edges1} / {edges2}: expected {expected}, got {actual}")
+    print(f"Checked {len(cases)} substructure cases, {mismatches} mismatches")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    test_is_subgraph()
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import multiprocessing
+from collections import namedtuple
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # not on Windows: memory budgets are not enforced there
+    resource = None
+
+# seconds: wall-clock limit per question (a job of k questions gets k times
+# as long); memory: bytes a worker may allocate on top of what it holds
+# after start-up. Either may be None for no limit.
+Budget = namedtuple("Budget", ["seconds", "memory"])
+
+
+def scaled(budget, factor):
+    return Budget(
+        budget.seconds * factor if budget.seconds is not None else None,
+        budget.memory * factor if budget.memory is not None else None,
+    )
+
+
+def _in_use():
+    # bytes of address space the worker holds; where there is no
+    # /proc/self/statm (macOS, the BSDs), its peak resident size instead
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, in KiB elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _limit_memory(memory):
+    if memory is None or resource is None:
+        return
+    in_use = _in_use()
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = in_use + int(memory)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _worker(conn, func, memory, initializer):
+    if initializer is not None:
+        initializer()
+    _limit_memory(memory)
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        key, args = job
+        try:
+            result = func(*args)
+        except MemoryError:
+            conn.send((key, "memory", None))
+        except Exception as e:
+            conn.send((key, "error", f"{type(e).__name__}: {e}"))
+        else:
+            conn.send((key, "ok", result))
+    conn.close()
+
+
+class _Slot:
+    def __init__(self, func, memory, initializer):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker, args=(child, func, memory, initializer), daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None
+        self.deadline = None
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.process.join()
+        self.conn.close()
+
+
+def run_supervised(func, jobs, budget, workers=1, initializer=None):
+    # Runs func(*args) for every (args, weight) in jobs on `workers` worker
+    # processes, one job at a time each, and yields (index, status, result)
+    # as jobs finish. status is "ok", or "time" when the job ran past
+    # budget.seconds * weight (its worker is killed and replaced), "memory"
+    # when it went over budget.memory, "crashed" when the worker died and
+    # "error" when func raised (result is then the message).
+    pending = list(range(len(jobs)))[::-1]
+    slots = [_Slot(func, budget.memory, initializer) for _ in range(min(workers, len(jobs)))]
+    try:
+        while True:
+            for slot in slots:
+                if slot.job is None and pending:
+                    slot.job = pending.pop()
+                    args, weight = jobs[slot.job]
+                    slot.deadline = None if budget.seconds is None else time.monotonic() + budget.seconds * weight
+                    slot.conn.send((slot.job, args))
+            busy = [slot for slot in slots if slot.job is not None]
+            if not busy:
+                break
+            deadlines = [slot.deadline for slot in busy if slot.deadline is not None]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([slot.conn for slot in busy], timeout)
+            for i, slot in enumerate(slots):
+                if slot.job is None:
+                    continue
+                if slot.conn in ready:
+                    try:
+                        key, status, result = slot.conn.recv()
+                    except (EOFError, OSError):
+                        yield slot.job, "crashed", None
+                        slot.stop(kill=True)
+                        slots[i] = _Slot(func, budget.memory, initializer)
+                        continue
+                    slot.job = None
+                    yield key, status, result
+                elif slot.deadline is not None and time.monotonic() >= slot.deadline:
+                    yield slot.job, "time", None
+                    slot.stop(kill=True)
+                    slots[i] = _Slot(func, budget.memory, initializer)
+    finally:
+        for slot in slots:
+            slot.stop(kill=slot.job is not None)
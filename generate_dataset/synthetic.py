@@ -0,0 +1,259 @@
+import hashlib
+import multiprocessing
+import random
+import time
+import numpy as np
+import prompts
+import task_registry
+import utils
+
+_UPPER_PAIRS = {}
+
+
+def upper_pairs(n):
+    # every (u, v) with u < v, in row-major order
+    if n not in _UPPER_PAIRS:
+        _UPPER_PAIRS[n] = np.column_stack(np.triu_indices(n, 1)).astype(np.int64)
+    return _UPPER_PAIRS[n]
+
+
+def undirected_graph(rng, n, p):
+    # Erdos-Renyi G(n, p): one random draw per node pair
+    pairs = upper_pairs(n)
+    return pairs[rng.random(len(pairs)) < p]
+
+
+def directed_graph(rng, n, p):
+    src, dst = np.nonzero((rng.random((n, n)) < p) & ~np.eye(n, dtype=bool))
+    return np.column_stack([src, dst]).astype(np.int64)
+
+
+def sort_edges(edges):
+    return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+
+def random_dag(rng, n, p):
+    # G(n, p) oriented along a random node order
+    order = rng.permutation(n)
+    return sort_edges(order[undirected_graph(rng, n, p)])
+
+
+def bipartite_graph(rng, n, p):
+    # directed G(n, p) restricted to the arcs between two random sides
+    side = rng.random(n) < 0.5
+    edges = directed_graph(rng, n, p)
+    return edges[side[edges[:, 0]] != side[edges[:, 1]]]
+
+
+def random_forest(rng, n, keep=0.8):
+    # random recursive tree (node i hangs off a uniform earlier node) under a
+    # random labelling, with each edge kept with probability keep
+    parents = (rng.random(n - 1) * np.arange(1, n)).astype(np.int64)
+    edges = np.column_stack([parents, np.arange(1, n)])[rng.random(n - 1) < keep]
+    order = rng.permutation(n)
+    return sort_edges(np.sort(order[edges], axis=1))
+
+
+def with_hamiltonian_path(rng, n, edges):
+    path = rng.permutation(n)
+    planted = np.sort(np.column_stack([path[:-1], path[1:]]), axis=1)
+    return np.unique(np.vstack([edges, planted]), axis=0)
+
+
+def with_weights(rng, edges, max_weight=10):
+    return np.column_stack([edges, rng.integers(1, max_weight + 1, len(edges))])
+
+
+def random_pattern(rng, k, p):
+    # a small directed pattern on nodes 0..k-1 that touches all of them: a
+    # random tree with random directions plus G(k, p) arcs
+    parents = np.array([rng.integers(0, i) for i in range(1, k)], dtype=np.int64)
+    tree = np.column_stack([parents, np.arange(1, k)])
+    flip = rng.random(len(tree)) < 0.5
+    tree[flip] = tree[flip][:, ::-1]
+    return np.unique(np.vstack([tree, directed_graph(rng, k, p)]), axis=0)
+
+
+def edge_probability(rng, n, density):
+    # density: an edge probability, a (low, high) range of them, or None for
+    # sparse graphs with an average degree between 1 and 4
+    if density is None:
+        return min(1.0, rng.uniform(1, 4) / max(n - 1, 1))
+    if isinstance(density, (tuple, list)):
+        return rng.uniform(*density)
+    return density
+
+
+# Graph families, one per task: (rng, num_nodes, p) -> GraphContext.
+# Structural tasks mix graphs with and without the property asked about.
+
+def cycle_graph(rng, n, p):
+    edges = undirected_graph(rng, n, p) if rng.random() < 0.5 else random_forest(rng, n)
+    return task_registry.GraphContext(n, edges)
+
+
+def connectivity_graph(rng, n, p):
+    return task_registry.GraphContext(n, undirected_graph(rng, n, p))
+
+
+def bipartite_task_graph(rng, n, p):
+    edges = bipartite_graph(rng, n, p) if rng.random() < 0.5 else directed_graph(rng, n, p)
+    return task_registry.GraphContext(n, edges)
+
+
+def topology_graph(rng, n, p):
+    return task_registry.GraphContext(n, random_dag(rng, n, p))
+
+
+def shortest_graph(rng, n, p):
+    return task_registry.GraphContext(n, with_weights(rng, undirected_graph(rng, n, p)))
+
+
+def triangle_graph(rng, n, p):
+    node_weights = np.column_stack([np.arange(n), rng.integers(1, 11, n)]).tolist()
+    return task_registry.GraphContext(n, undirected_graph(rng, n, p), node_weights)
+
+
+def flow_graph(rng, n, p):
+    return task_registry.GraphContext(n, with_weights(rng, directed_graph(rng, n, p)))
+
+
+def hamilton_graph(rng, n, p):
+    edges = undirected_graph(rng, n, p)
+    if rng.random() < 0.5:
+        edges = with_hamiltonian_path(rng, n, edges)
+    return task_registry.GraphContext(n, edges)
+
+
+def substructure_graph(rng, n, p, pattern_nodes=(2, 4)):
+    # half of the patterns are planted into G under a random node mapping
+    k = int(rng.integers(pattern_nodes[0], pattern_nodes[1] + 1))
+    pattern = random_pattern(rng, k, 0.3)
+    edges = directed_graph(rng, n, p)
+    if rng.random() < 0.5:
+        mapping = rng.choice(n, k, replace=False)
+        edges = np.unique(np.vstack([edges, mapping[pattern]]), axis=0)
+    context = task_registry.GraphContext(n, edges)
+    context.pattern = [(prompts.pattern_node(u), prompts.pattern_node(v)) for u, v in pattern.tolist()]
+    return context
+
+
+GRAPHS = {
+    'cycle': cycle_graph,
+    'connectivity': connectivity_graph,
+    'bipartite': bipartite_task_graph,
+    'topology': topology_graph,
+    'shortest': shortest_graph,
+    'triangle': triangle_graph,
+    'flow': flow_graph,
+    'hamilton': hamilton_graph,
+    'substructure': substructure_graph,
+}
+
+# queries of the tasks the registry has no dataset2 renderer for
+QUERIES = {
+    'triangle': lambda context, params: prompts.triangle_query(
+        context.num_nodes, context.node_weights, context.pairs()),
+    'flow': lambda context, params: prompts.flow_query(
+        context.num_nodes, context.edges.tolist(), *params),
+    'substructure': lambda context, params: prompts.substructure_query(
+        context.num_nodes, context.pairs(), len({node for edge in context.pattern for node in edge}),
+        [(prompts.PATTERN_NODES.index(u), prompts.PATTERN_NODES.index(v)) for u, v in context.pattern]),
+}
+
+
+def render(task_name, context, params=()):
+    if task_name in QUERIES:
+        return QUERIES[task_name](context, params)
+    return task_registry.get_task(task_name).render(context.num_nodes, context.edges.tolist(), *params)
+
+
+def chunk_rngs(seed, task_name, chunk):
+    # a numpy generator for the graphs and a random.Random for the pair
+    # samplers, both derived from the run seed and the chunk only
+    digest = hashlib.sha256(repr((seed, task_name, chunk)).encode("utf-8")).digest()
+    value = int.from_bytes(digest[:8], "big")
+    return np.random.default_rng(value), random.Random(value)
+
+
+def synthetic_chunk(unit):
+    # num_graphs labelled graphs of one task; pair tasks ask
+    # questions_per_graph pairs about each graph
+    task_name, chunk, num_graphs, node_min, node_max, density, seed, questions_per_graph = unit
+    rng, pair_rng = chunk_rngs(seed, task_name, chunk)
+    task_def = task_registry.get_task(task_name)
+    contexts = []
+    for n in rng.integers(node_min, node_max + 1, num_graphs).tolist():
+        # queries need at least one edge, so edgeless draws are redrawn
+        context = GRAPHS[task_name](rng, n, edge_probability(rng, n, density))
+        while len(context.edges) == 0:
+            context = GRAPHS[task_name](rng, n, edge_probability(rng, n, density))
+        contexts.append(context)
+    items = []
+    if task_def.kind == task_registry.SINGLE:
+        for context, answer in zip(contexts, task_def.answer(contexts)):
+            items.append({"task": task_name, "query": render(task_name, context), "answer": answer})
+    elif task_def.kind == task_registry.VARIANT:
+        for context in contexts:
+            answer = task_def.answer(context, [context])[0]
+            items.append({"task": task_name, "query": render(task_name, context), "answer": answer})
+    else:
+        for context in contexts:
+            sampler = task_def.sampler(context.edges, context.num_nodes, pair_rng)
+            pairs = [pair for pair in (sampler.draw() for _ in range(questions_per_graph)) if pair is not None]
+            for pair, answer in zip(pairs, task_def.answer(context, pairs)):
+                items.append({"task": task_name, "query": render(task_name, context, pair), "answer": answer})
+    return items
+
+
+def synthetic_items(task_name, num_graphs, node_min, node_max, density=None, seed=0,
+                    workers=None, chunk_size=1000, questions_per_graph=1):
+    # Labelled items in the GraphInstruct record format ({"task", "query",
+    # "answer"}), so they can go through classify_task / sampling like the
+    # original data. Chunks are generated and labelled in a pool and come
+    # back in chunk order, so the items depend on the seed only.
+    if task_name not in GRAPHS:
+        raise ValueError(f"No synthetic generator for task {task_name}")
+    units = [
+        (task_name, chunk, min(chunk_size, num_graphs - start), node_min, node_max, density, seed, questions_per_graph)
+        for chunk, start in enumerate(range(0, num_graphs, chunk_size))
+    ]
+    if workers is not None and workers <= 1:
+        for chunk in map(synthetic_chunk, units):
+            yield from chunk
+        return
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.imap(synthetic_chunk, units):
+            yield from chunk
+
+
+def generate_synthetic(task_name, output_file, num_graphs, node_min, node_max, density=None, seed=0,
+                       workers=None, chunk_size=1000, questions_per_graph=1):
+    start_time = time.perf_counter()
+    items = synthetic_items(
+        task_name, num_graphs, node_min, node_max, density, seed, workers, chunk_size, questions_per_graph
+    )
+    count = utils.save_data(items, output_file)
+    elapsed = time.perf_counter() - start_time
+    print(f"Generated {count} {task_name} items in {elapsed:.1f}s ({count / elapsed * 3600:.0f}/h), saved to {output_file}")
+    return count
+
+
+# node ranges of the tasks whose oracles are exponential
+SYNTHETIC_NODE_RANGES = {'hamilton': (5, 60), 'substructure': (5, 30)}
+
+
+def generate_task_list(output_file="GraphInstruct-synthetic.json", num_graphs=10000, seed=0, workers=None):
+    # All nine tasks in one file, ready for classify_task.split_tasks.
+    items = (
+        item for task_name in GRAPHS
+        for item in synthetic_items(task_name, num_graphs, *SYNTHETIC_NODE_RANGES.get(task_name, (5, 100)),
+                                    seed=seed, workers=workers)
+    )
+    count = utils.save_data(items, output_file)
+    print(f"Saved {count} synthetic items to {output_file}")
+    return count
+
+
+if __name__ == "__main__":
+    generate_task_list()
@@ -0,0 +1,260 @@
+import numpy as np
+import answer_tables
+import batch_kernels
+import graph_algo
+import graph_csr
+import incremental
+import flow
+import hamilton
+import motif_census
+import pair_sampler
+import prompts
+import query_parser
+import subgraph_match
+import triangles
+
+# kinds of task: "pair" asks about node pairs of a graph, "variant" asks one
+# question about a graph and its edge-removed copies, "single" asks one
+# question per graph
+PAIR = "pair"
+VARIANT = "variant"
+SINGLE = "single"
+
+TASKS = {}
+
+
+class GraphContext:
+    # One parsed graph and the structure derived from it, built on first use
+    # and shared by every task asked about the graph: connectivity and
+    # shortest read the same AnswerTables, cycle and hamilton the same
+    # bridges, bipartite / topology / flow the same directed CSR.
+    def __init__(self, num_nodes, edges, node_weights=None, pattern=None):
+        self.num_nodes = num_nodes
+        self.edges = edges
+        self.node_weights = node_weights
+        self.pattern = pattern
+        self._cache = {}
+
+    def _cached(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def weighted(self):
+        return self.edges.shape[1] == 3
+
+    def pairs(self):
+        return self._cached("pairs", lambda: list(map(tuple, self.edges[:, :2].tolist())))
+
+    def undirected(self):
+        return self._cached("undirected", lambda: graph_csr.build_csr(self.edges, weighted=self.weighted))
+
+    def directed(self):
+        return self._cached("directed", lambda: graph_csr.build_csr(self.edges, directed=True, weighted=self.weighted))
+
+    def components(self):
+        return self._cached("components", lambda: graph_csr.connected_components(self.undirected()))
+
+    def bridges(self):
+        def build():
+            g = self.undirected()
+            labels = g.labels
+            return {(min(labels[u], labels[v]), max(labels[u], labels[v])) for u, v in graph_csr.bridges(g)}
+        return self._cached("bridges", build)
+
+    def tables(self):
+        return self._cached("tables", lambda: answer_tables.AnswerTables(self.undirected(), self.components()[0]))
+
+
+def graph_context(num_nodes, edges, node_weights=None):
+    # edges: a list of (u, v) / (u, v, w) tuples or an (m, 2|3) array
+    arr = np.asarray(edges, dtype=np.int64)
+    if arr.size == 0:
+        arr = arr.reshape(0, 2)
+    return GraphContext(num_nodes, arr, node_weights)
+
+
+class Task:
+    # Everything the pipeline needs to know about one task:
+    #   parse(query) -> GraphContext of the graph a rendered query asks about
+    #   render(num_nodes, edges, params) -> the dataset2 query
+    #   question(params) -> the question sentence swapped into dataset1
+    #     queries, which ends after `sentences` periods
+    #   sampler(edges, num_nodes, rng) -> PairSampler of question pairs
+    #   answer(...) -> one answer per question, see the answer_* functions
+    #   cost(num_nodes, num_edges, count) -> relative work for the pool
+    #   batch -> answers a whole shard at once over padded adjacency stacks
+    #     (batch_kernels): batch(contexts, pairs per context) for a pair
+    #     task, batch(contexts) with one context per question otherwise
+    #   code -> the modules and functions its answers depend on, for build
+    #     keys; prompt_code() is the same for its rendered queries
+    def __init__(self, name, kind, answer, parse=None, render=None, question=None, sentences=1,
+                 sampler=None, cost=None, batch=None, code=()):
+        self.name = name
+        self.kind = kind
+        self.answer = answer
+        self.parse = parse or parse_graph
+        self.render = render
+        self.question = question
+        self.sentences = sentences
+        self.sampler = sampler
+        self.cost = cost or linear_cost
+        self.batch = batch
+        self.code = list(code)
+
+    def prompt_code(self):
+        return [f for f in (self.render, self.question) if f is not None]
+
+    def sampler_code(self):
+        return [self.sampler] if self.sampler is not None else []
+
+
+def register(task):
+    TASKS[task.name] = task
+    return task
+
+
+def get_task(task_name):
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown task: {task_name}")
+    return TASKS[task_name]
+
+
+def parse_graph(query):
+    parsed = query_parser.parse_query(query)
+    edges = parsed.edges
+    if parsed.weights is not None:
+        edges = np.column_stack([edges, parsed.weights])
+    node_weights = parsed.node_weights.tolist() if parsed.node_weights is not None else None
+    return GraphContext(parsed.num_nodes, edges.astype(np.int64), node_weights)
+
+
+def parse_subgraph(query):
+    # the pattern's nodes are letters, which parse_query does not read
+    edges, pattern = graph_algo.extract_edges_subgraph(query)
+    context = graph_context(graph_algo.extract_node_num(query), edges)
+    context.pattern = pattern
+    return context
+
+
+def linear_cost(num_nodes, num_edges, count=1):
+    return count * (num_nodes + num_edges)
+
+
+def yes_no(value):
+    return "### Yes" if value else "### No"
+
+
+# Answers. A pair task gets one context and the node pairs asked about it.
+# A variant task gets the unmodified graph's context (or None) and one
+# context per variant. A single task gets a list of contexts.
+
+def answer_connectivity(context, pairs):
+    tables = context.tables()
+    return [yes_no(tables.connected(node1, node2)) for node1, node2 in pairs]
+
+
+def answer_shortest(context, pairs):
+    tables = context.tables()
+    answers = []
+    for node1, node2 in pairs:
+        weight = tables.shortest_distance(node1, node2)
+        answers.append("### There is no path between nodes" if weight is None else "### " + str(weight))
+    return answers
+
+
+def answer_flow(context, pairs):
+    return graph_algo.max_flow_many(context.directed(), pairs)
+
+
+def variant_answers(task_name):
+    def answer(base, variants):
+        # without the unmodified graph the first variant serves as the base;
+        # the oracle falls back to a full answer for anything it cannot update
+        if base is None:
+            base = variants[0]
+        oracle = incremental.VariantOracle(task_name, base.pairs(), base.num_nodes, context=base)
+        return [oracle.answer(variant.pairs(), variant.num_nodes) for variant in variants]
+    return answer
+
+
+def batch_connectivity(contexts, pairs):
+    return [[yes_no(value) for value in values] for values in batch_kernels.connected_pairs(contexts, pairs)]
+
+
+def batch_cycle(contexts):
+    return [yes_no(value) for value in batch_kernels.has_cycle(contexts)]
+
+
+def batch_bipartite(contexts):
+    return [yes_no(value) for value in batch_kernels.is_bipartite(contexts)]
+
+
+def batch_triangle(contexts):
+    return [graph_algo.triangle_answer(value) for value in batch_kernels.max_triangle_weight(contexts)]
+
+
+def answer_triangle(contexts):
+    return [graph_algo.max_weight_of_triangle(context.node_weights, context.undirected()) for context in contexts]
+
+
+def answer_substructure(contexts):
+    # one motif census over the whole batch; patterns repeat, so many
+    # answers come from a census mismatch or the per-pattern cache
+    answers = motif_census.contains_all([context.edges[:, :2] for context in contexts],
+                                        [context.pattern for context in contexts])
+    return [yes_no(answer) for answer in answers]
+
+
+register(Task(
+    'cycle', VARIANT, variant_answers('cycle'),
+    render=prompts.cycle_query, batch=batch_cycle,
+    code=[graph_algo.has_cycle, incremental, batch_cycle, batch_kernels],
+))
+register(Task(
+    'connectivity', PAIR, answer_connectivity,
+    render=prompts.connectivity_query, question=prompts.connectivity_question,
+    sampler=lambda edges, num_nodes, rng: pair_sampler.all_pairs_sampler(num_nodes, rng),
+    batch=batch_connectivity,
+    code=[answer_connectivity, answer_tables, batch_connectivity, batch_kernels],
+))
+register(Task(
+    'bipartite', VARIANT, variant_answers('bipartite'),
+    render=prompts.bipartite_query, batch=batch_bipartite,
+    code=[graph_algo.is_bipartite, incremental, batch_bipartite, batch_kernels],
+))
+register(Task(
+    'topology', VARIANT, variant_answers('topology'),
+    render=prompts.topology_query,
+    code=[graph_algo.topological_sort, incremental],
+))
+register(Task(
+    'shortest', PAIR, answer_shortest,
+    render=prompts.shortest_query, question=prompts.shortest_question, sentences=2,
+    sampler=pair_sampler.component_pair_sampler,
+    cost=lambda num_nodes, num_edges, count=1: num_nodes ** 3 + count,
+    code=[answer_shortest, answer_tables],
+))
+register(Task(
+    'triangle', SINGLE, answer_triangle, batch=batch_triangle,
+    code=[answer_triangle, graph_algo.max_weight_of_triangle, triangles, batch_triangle, batch_kernels],
+))
+register(Task(
+    'flow', PAIR, answer_flow,
+    question=prompts.flow_question,
+    sampler=pair_sampler.reachability_pair_sampler,
+    cost=lambda num_nodes, num_edges, count=1: count * num_nodes * num_nodes * max(num_edges, 1),
+    code=[answer_flow, flow],
+))
+register(Task(
+    'hamilton', VARIANT, variant_answers('hamilton'),
+    render=prompts.hamilton_query,
+    cost=lambda num_nodes, num_edges, count=1: count * num_nodes * 2 ** min(num_nodes, 40),
+    code=[graph_algo.hamiltonian_witness, graph_algo._hamiltonian_setup, hamilton, incremental],
+))
+register(Task(
+    'substructure', SINGLE, answer_substructure, parse=parse_subgraph,
+    cost=lambda num_nodes, num_edges, count=1: num_nodes ** 4,
+    code=[answer_substructure, motif_census, subgraph_match],
+))
@@ -2,7 +2,14 @@ import json
 import random
 from pathlib import Path
 import os
+import multiprocessing
+from collections import defaultdict
+from functools import partial
+import numpy as np
 import graph_algo
+import sampling
+import supervisor
+import task_registry
 from tqdm import tqdm
 
 
@@ -11,109 +18,335 @@ def load_data(task_file):
         return [json.loads(line) for line in f]
 
 
+def iter_data(task_file):
+    with open(task_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_task_index(index_file="task-list/index.npz"):
+    # task -> (byte offsets into task-list/<task>.json, node count per record),
+    # as written by classify_task.split_tasks
+    index = {}
+    with np.load(index_file) as data:
+        for key in data.files:
+            task, field = key.rsplit("/", 1)
+            index.setdefault(task, {})[field] = data[key]
+    return {task: (fields["offsets"], fields["node_num"]) for task, fields in index.items()}
+
+
+def read_records(task_file, offsets):
+    with open(task_file, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+
 def save_data(data, output_file):
-    with open(output_file, "w", encoding="utf-8") as f:
+    # Items are appended to a temporary file next to output_file, which only
+    # replaces the target once everything was written: readers never see a
+    # partial file, and data may be a generator still reading output_file.
+    tmp_file = f"{output_file}.tmp"
+    count = 0
+    with open(tmp_file, "w", encoding="utf-8") as f:
         for item in data:
             f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, output_file)
+    return count
+
+
+def batches(items, batch_size, key=None):
+    # Consecutive items with the same key always share a batch, so per-graph
+    # batch oracles still see every question on their graph.
+    batch = []
+    last = None
+    for item in items:
+        current = key(item) if key is not None else None
+        if len(batch) >= batch_size and (key is None or current != last):
+            yield batch
+            batch = []
+        batch.append(item)
+        last = current
+    if batch:
+        yield batch
 
 
 def sample_tasks(task_file, sampled_file, num_samples, node_num_min, node_num_max):
-    tasks = load_data(task_file)
+    return sample_bins(task_file, sampled_file, [(num_samples, node_num_min, node_num_max)])
 
-    if Path(sampled_file).exists():
-        sampled_tasks = load_data(sampled_file)
-        sampled_set = {item["graph"]: item for item in sampled_tasks}
-    else:
-        sampled_set = {}
 
-    remaining_tasks = []
-    for task in tasks:
-        task_json = json.dumps(task, sort_keys=True)
-        if task_json not in [json.dumps(item, sort_keys=True) for item in sampled_set.values()]:
-            remaining_tasks.append(task)
+def sample_bins(task_file, sampled_file, bins, with_edges=False, node_nums=None, rng=random):
+    # Draws every (num_samples, node_num_min, node_num_max) bin without
+    # replacement from one StratifiedSampler pass over task_file, skipping
+    # records already in sampled_file, and writes sampled_file once.
+    existing = load_data(sampled_file) if Path(sampled_file).exists() else []
+    sampler = sampling.StratifiedSampler(
+        task_file, exclude=[sampling.sampled_record_hash(item) for item in existing], node_nums=node_nums, rng=rng
+    )
+    sampled = []
+    for num_samples, node_num_min, node_num_max in bins:
+        available = sampler.available(node_num_min, node_num_max)
+        if available < num_samples:
+            print(
+                f"Warning: Not enough remaining samples. Available: {available}, "
+                f"Required: {num_samples}. Sampling all available."
+            )
+        drawn = sampler.sample(num_samples, node_num_min, node_num_max)
+        print(f"Sampled {len(drawn)} tasks from {task_file}, node range: [{node_num_min}, {node_num_max}]")
+        sampled.extend(drawn)
 
-    filtered_tasks = [
-        task for task in remaining_tasks
-        if node_num_min <= graph_algo.extract_node_num(task["query"]) <= node_num_max
-    ]
+    for i, task in enumerate(sampled, start=len(existing) + 1):
+        task["graph"] = f"graph{i}"
+        task["complexity"] = sampling.complexity(graph_algo.extract_node_num(task["query"]))
+        if with_edges:
+            task["edges"] = graph_algo.extract_edges_d(task["query"])
 
-    if len(filtered_tasks) < num_samples:
-        print(
-            f"Warning: Not enough remaining samples. Available: {len(filtered_tasks)}, "
-            f"Required: {num_samples}. Sampling all available."
-        )
-        num_samples = len(filtered_tasks)
+    save_data(existing + sampled, sampled_file)
+    print(f"Saved {len(existing) + len(sampled)} sampled tasks to {sampled_file}")
+    return sampled
 
-    sampled = random.sample(filtered_tasks, num_samples)
 
-    for i, task in enumerate(sampled, start=len(sampled_set) + 1):
-        task["graph"] = f"graph{i}"
+def get_answer(task_path, task_name, cache=None, workers=1, batch_size=10000, budget=None, escalate=None):
+    # With a supervisor.Budget every work unit runs in a supervised worker;
+    # questions it could not answer in time or memory keep no new answer and
+    # are listed in <task_file>.unresolved. escalate=k retries them at the
+    # end with k times the budget.
+    task_file = f"{task_path}/generated_{task_name}.json"
+    key = None
+    kind = task_registry.get_task(task_name).kind
+    if kind == task_registry.PAIR:
+        key = lambda task: graph_algo.extract_edges_text(task['query'])
+    elif kind == task_registry.VARIANT:
+        key = lambda task: task.get('graph')
+    unresolved = []
+
+    def answered():
+        position = 0
+        for batch in batches(iter_data(task_file), batch_size, key):
+            positions = {id(task): position + i for i, task in enumerate(batch)}
+            for task, reason in answer_batch(batch, task_name, cache, workers, budget):
+                unresolved.append({"index": positions[id(task)], "reason": reason, "item": task})
+            position += len(batch)
+            yield from batch
+
+    total_questions = save_data(answered(), task_file)
+    print(f"Total questions: {total_questions}")
+    if unresolved and escalate:
+        unresolved = escalate_unresolved(unresolved, task_file, task_name, cache, workers, supervisor.scaled(budget, escalate))
+    save_report(unresolved, f"{task_file}.unresolved")
+    if unresolved:
+        print(f"Unresolved: {len(unresolved)} questions, listed in {task_file}.unresolved")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Answer cache: {stats['hits']} hits, {stats['misses']} misses")
+    print(f"Answers for {task_name} saved to {task_file}")
+
+
+def escalate_unresolved(unresolved, task_file, task_name, cache, workers, budget):
+    # one more attempt with the larger budget; what it answers is written
+    # back into task_file, the rest is returned
+    items = [entry["item"] for entry in unresolved]
+    still = {id(task): reason for task, reason in answer_batch(items, task_name, cache, workers, budget)}
+    answers = {entry["index"]: entry["item"]["answer"] for entry in unresolved if id(entry["item"]) not in still}
+    apply_answers(task_file, answers)
+    print(f"Escalation answered {len(answers)} of {len(unresolved)} unresolved questions")
+    return [dict(entry, reason=still[id(entry["item"])]) for entry in unresolved if id(entry["item"]) in still]
+
+
+def apply_answers(data_file, answers):
+    # answers maps line index -> answer; one streaming pass over data_file
+    def patched():
+        for i, item in enumerate(iter_data(data_file)):
+            if i in answers:
+                item['answer'] = answers[i]
+            yield item
+
+    if answers:
+        save_data(patched(), data_file)
+
+
+def save_report(entries, report_file):
+    if entries:
+        save_data(entries, report_file)
+    elif os.path.exists(report_file):
+        os.remove(report_file)
 
-        node_num = graph_algo.extract_node_num(task["query"])
-        if 5 <= node_num <= 35:
-            task["complexity"] = "easy"
-        elif 35 < node_num <= 65:
-            task["complexity"] = "middle"
-        elif 65 < node_num <= 100:
-            task["complexity"] = "hard"
-        else:
-            task["complexity"] = "unknown"
 
-        sampled_set[task["graph"]] = task
+def answer_batch(tasks, task_name, cache=None, workers=1, budget=None):
+    # Returns the (task, reason) pairs a budget left unanswered.
+    pending = tasks
+    if cache is not None:
+        pending = []
+        for task in tasks:
+            answer = cache.get(task_name, task['query'])
+            if answer is None:
+                pending.append(task)
+            else:
+                task['answer'] = answer
+    unresolved = []
+    if budget is not None:
+        unresolved = answer_tasks_supervised(pending, task_name, workers, budget)
+        # no answer rather than the one the item came with
+        for task, _ in unresolved:
+            task.pop('answer', None)
+    elif workers > 1:
+        answer_tasks_parallel(pending, task_name, workers)
+    else:
+        answer_tasks(pending, task_name)
+    if cache is not None:
+        skipped = {id(task) for task, _ in unresolved}
+        for task in pending:
+            if id(task) not in skipped:
+                cache.put(task_name, task['query'], task['answer'])
+        cache.commit()
+    return unresolved
+
+
+def answer_tasks(tasks, task_name):
+    task_def = task_registry.get_task(task_name)
+    if task_def.batch is not None:
+        answer_tasks_batched(tasks, task_def)
+        return
+    if task_def.kind == task_registry.SINGLE:
+        contexts = [task_def.parse(task['query']) for task in tqdm(tasks, desc=f"Parsing {task_name}")]
+        for task, result in zip(tasks, task_def.answer(contexts)):
+            task['answer'] = result
+        return
+    for unit in tqdm(work_units(tasks, task_name), desc=f"Answering {task_name}"):
+        for task, result in zip(unit, answer_unit(task_def, unit)):
+            task['answer'] = result
+
 
-    save_data(list(sampled_set.values()), sampled_file)
-    print(
-        f"Sampled {len(sampled)} tasks to {sampled_file}, "
-        f"node range: [{node_num_min}, {node_num_max}]"
+def answer_tasks_batched(tasks, task_def):
+    # The whole shard goes through the task's batch kernel: a pair task
+    # still parses each graph once, other tasks parse every question.
+    if task_def.kind == task_registry.PAIR:
+        units = work_units(tasks, task_def.name)
+        contexts = [task_def.parse(unit[0]['query']) for unit in tqdm(units, desc=f"Parsing {task_def.name}")]
+        pairs = [[graph_algo.extract_nodes(task['query']) for task in unit] for unit in units]
+        for unit, answers in zip(units, task_def.batch(contexts, pairs)):
+            for task, answer in zip(unit, answers):
+                task['answer'] = answer
+        return
+    contexts = [task_def.parse(task['query']) for task in tqdm(tasks, desc=f"Parsing {task_def.name}")]
+    for task, answer in zip(tasks, task_def.batch(contexts)):
+        task['answer'] = answer
+
+
+def answer_unit(task_def, unit):
+    # Questions generated from one graph share its parse: a pair task parses
+    # the graph once and looks every pair up in its answer tables, a variant
+    # task updates facts about the base graph (the item with removed_edge
+    # None) for every edge-removed variant.
+    if task_def.kind == task_registry.PAIR:
+        context = task_def.parse(unit[0]['query'])
+        return task_def.answer(context, [graph_algo.extract_nodes(task['query']) for task in unit])
+    variants = [task_def.parse(task['query']) for task in unit]
+    base = next(
+        (context for context, task in zip(variants, unit) if 'removed_edge' in task and task['removed_edge'] is None),
+        None,
     )
+    return task_def.answer(base, variants)
 
-    return sampled
 
+def work_units(tasks, task_name):
+    # Questions that share a graph stay together so the per-graph batch and
+    # incremental oracles keep working inside a worker.
+    kind = task_registry.get_task(task_name).kind
+    if kind == task_registry.PAIR:
+        groups = defaultdict(list)
+        for task in tasks:
+            groups[graph_algo.extract_edges_text(task['query'])].append(task)
+        return list(groups.values())
+    if kind == task_registry.VARIANT:
+        groups = defaultdict(list)
+        for i, task in enumerate(tasks):
+            groups[task.get('graph', i)].append(task)
+        return list(groups.values())
+    return [[task] for task in tasks]
 
-def get_answer(task_path, task_name):
-    task_file = f"{task_path}/generated_{task_name}.json"
-    tasks = load_data(task_file)
-    total_questions = len(tasks)
-    print(f"Total questions: {total_questions}")
 
-    for i, task in enumerate(tqdm(tasks, desc=f"Answering {task_name}"), start=1):
-        query = task['query']
-        if task_name == 'cycle':
-            edges = graph_algo.extract_edges_a(query)
-            result = graph_algo.has_cycle(edges)
-        elif task_name == 'connectivity':
-            edges = graph_algo.extract_edges_a(query)
-            node1, node2 = graph_algo.extract_nodes(query)
-            result = graph_algo.are_nodes_connected(edges, node1, node2)
-        elif task_name == 'bipartite':
-            edges = graph_algo.extract_edges_b(query)
-            result = graph_algo.is_bipartite(edges)
-        elif task_name == 'topology':
-            edges = graph_algo.extract_edges_b(query)
-            result = graph_algo.topological_sort(edges)
-        elif task_name == 'shortest':
-            edges = graph_algo.extract_edges_c(query)
-            node1, node2 = graph_algo.extract_nodes(query)
-            result = graph_algo.shortest_path_weight(edges, node1, node2)
-        elif task_name == 'triangle':
-            edges = graph_algo.extract_edges_a(query)
-            node_weights = graph_algo.extract_node_weights(query)
-            result = graph_algo.max_weight_of_triangle(node_weights, edges)
-        elif task_name == 'flow':
-            edges = graph_algo.extract_edges_d(query)
-            source, target = graph_algo.extract_nodes(query)
-            result = graph_algo.max_flow(edges, source, target)
-        elif task_name == 'hamilton':
-            edges = graph_algo.extract_edges_a(query)
-            num_nodes = graph_algo.extract_node_num(query)
-            result = graph_algo.has_hamiltonian_path(edges, num_nodes)
-        elif task_name == 'substructure':
-            edges1, edges2 = graph_algo.extract_edges_subgraph(query)
-            result = graph_algo.is_subgraph(edges1, edges2)
-        task['answer'] = result
-
-    save_data(tasks, task_file)
-    print(f"Answers for {task_name} saved to {task_file}")
+def expected_cost(task_name, query, count=1):
+    num_nodes = graph_algo.extract_node_num(query)
+    num_edges = graph_algo.extract_edges_text(query).count("(")
+    return task_cost(task_name, num_nodes, num_edges, count)
+
+
+def task_cost(task_name, num_nodes, num_edges, count=1):
+    if num_nodes == 0:
+        num_nodes = num_edges + 1
+    return task_registry.get_task(task_name).cost(num_nodes, num_edges, count)
+
+
+def pack_chunks(units, costs, num_chunks):
+    # Units sorted by expected cost, packed greedily into chunks of roughly
+    # equal cost: the expensive ones start first and the cheap tail is
+    # shipped in batches.
+    order = sorted(range(len(units)), key=lambda i: -costs[i])
+    target = sum(costs) / num_chunks
+    chunks = []
+    current = []
+    current_cost = 0
+    for i in order:
+        current.append(units[i])
+        current_cost += costs[i]
+        if current_cost >= target:
+            chunks.append(current)
+            current = []
+            current_cost = 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _answer_chunk(task_name, units):
+    tasks = [task for unit in units for task in unit]
+    answer_tasks(tasks, task_name)
+    return [task['answer'] for task in tasks]
+
+
+def _quiet_worker():
+    global tqdm
+    tqdm = partial(tqdm, disable=True)
+
+
+def answer_tasks_parallel(tasks, task_name, workers, chunks_per_worker=4):
+    # Answers are written back into the task dicts, so the output order is
+    # the input order whatever finishes first.
+    units = work_units(tasks, task_name)
+    costs = [expected_cost(task_name, unit[0]['query'], len(unit)) for unit in units]
+    chunks = pack_chunks(units, costs, workers * chunks_per_worker)
+    with multiprocessing.Pool(workers, initializer=_quiet_worker) as pool:
+        pending = [pool.apply_async(_answer_chunk, (task_name, chunk)) for chunk in chunks]
+        for chunk, result in zip(chunks, tqdm(pending, desc=f"Answering {task_name}")):
+            answers = result.get()
+            for task, answer in zip((task for unit in chunk for task in unit), answers):
+                task['answer'] = answer
+
+
+def answer_tasks_supervised(tasks, task_name, workers, budget):
+    # Each work unit is one supervised job, most expensive first, with a
+    # deadline of budget.seconds per question; a unit that runs out of time
+    # or memory, or fails, leaves its questions unanswered.
+    units = work_units(tasks, task_name)
+    costs = [expected_cost(task_name, unit[0]['query'], len(unit)) for unit in units]
+    order = sorted(range(len(units)), key=lambda i: -costs[i])
+    jobs = [((task_name, [units[i]]), len(units[i])) for i in order]
+    unresolved = []
+    results = supervisor.run_supervised(_answer_chunk, jobs, budget, max(workers, 1), initializer=_quiet_worker)
+    for j, status, result in tqdm(results, total=len(jobs), desc=f"Answering {task_name}"):
+        unit = units[order[j]]
+        if status == "ok":
+            for task, answer in zip(unit, result):
+                task['answer'] = answer
+        else:
+            reason = f"error: {result}" if status == "error" else status
+            unresolved.extend((task, reason) for task in unit)
+    return unresolved
 
 
 def extract_graph(sampled_file):
@@ -128,21 +361,26 @@ def extract_graph(sampled_file):
     print(f"Graph edges extracted and saved to {sampled_file}")
 
 
-def sample_dataset1():
+def task_node_nums(task_path, task_name):
+    index_file = f"{task_path}/index.npz"
+    if not Path(index_file).exists():
+        return None
+    return load_task_index(index_file).get(task_name, (None, None))[1]
+
+
+def sample_dataset1(rng=random, task_list=('connectivity', 'flow', 'shortest')):
     task_path = "task-list"
     sample_path = "sampled-dataset1"
     os.makedirs(sample_path, exist_ok=True)
-    task_list = ['connectivity', 'flow', 'shortest']
     for task_name in task_list:
         task_file = f"{task_path}/{task_name}.json"
         sampled_file = f"{sample_path}/sampled_{task_name}.json"
         num_samples = 100
-        sample_tasks(task_file, sampled_file, num_samples, 5, 35)
-        sample_tasks(task_file, sampled_file, num_samples, 36, 65)
-        sample_tasks(task_file, sampled_file, num_samples, 65, 100)
+        bins = [(num_samples, 5, 35), (num_samples, 36, 65), (num_samples, 65, 100)]
+        sample_bins(task_file, sampled_file, bins, node_nums=task_node_nums(task_path, task_name), rng=rng)
 
 
-def sample_dataset2():
+def sample_dataset2(rng=random):
     task_path = "task-list"
     sample_path = "sampled-dataset2"
     os.makedirs(sample_path, exist_ok=True)
@@ -150,8 +388,10 @@ def sample_dataset2():
     task_file = f"{task_path}/{task_name}.json"
     sampled_file = f"{sample_path}/sampled_{task_name}.json"
     num_samples = 100
-    sample_tasks(task_file, sampled_file, num_samples, 10, 20)
-    extract_graph(sampled_file)
+    sample_bins(
+        task_file, sampled_file, [(num_samples, 10, 20)],
+        with_edges=True, node_nums=task_node_nums(task_path, task_name), rng=rng,
+    )
 
 
 if __name__ == '__main__':